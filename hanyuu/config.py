@@ -25,6 +25,24 @@ class Settings(BaseSettings):
 
     ytdlp_cookiesfrombrowser: str
 
+    # connection pool of every process (each webapp worker has its own)
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30  # seconds to wait for connection when pool is exhausted
+    db_pool_recycle: int = 3600  # seconds before connection is reopened, -1 to keep forever
+    db_pool_pre_ping: bool = True
+    db_statement_cache_size: int = 100  # prepared statements cached by asyncpg per connection
+    db_query_cache_size: int = 500  # compiled statements cached by sqlalchemy per engine
+    db_pool_log_interval: float = 0  # seconds between pool stats in webapp log, 0 to disable
+    # connect through pgbouncer in transaction mode: no local pool and no prepared statement reuse.
+    # LISTEN of webapp events needs session mode, so db_host/db_port should then point at session pool
+    db_pgbouncer: bool = False
+
+    # seconds after last update of downloading source, when its twins stop waiting for it and download themselves
+    download_twin_timeout: float = 24 * 3600
+    # ffmpeg processes transcoding source proxy at once in each webapp worker, other requests get 503
+    proxy_max_transcodes: int = 4
+
 
 @lru_cache
 def get_settings() -> Settings:
@@ -1,9 +1,11 @@
-from typing import Optional
+from typing import Any, Dict, Optional
+from uuid import uuid4
 
 from sqlalchemy import URL
+from sqlalchemy.pool import NullPool
 
 import hanyuu.utils.engine as engine
-from hanyuu.config import get_settings
+from hanyuu.config import Settings, get_settings
 from hanyuu.utils.engine import LazyEngine
 
 from .models import Base
@@ -11,7 +13,31 @@ from .models import Base
 url: Optional[str] = None
 
 
-async def get_engine(echo: bool = False) -> LazyEngine:
+def engine_kwargs(settings: Settings) -> Dict[str, Any]:
+    if settings.db_pgbouncer:
+        # pgbouncer is the pool, shared by all processes. Server connection may change between transactions,
+        # so statements are not cached, and their names are unique, as they can collide on server connection
+        return {
+            "poolclass": NullPool,
+            "query_cache_size": settings.db_query_cache_size,
+            "connect_args": {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+            },
+        }
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "query_cache_size": settings.db_query_cache_size,
+        "connect_args": {"prepared_statement_cache_size": settings.db_statement_cache_size},
+    }
+
+
+async def get_engine(echo: bool = False, create_tables: bool = True) -> LazyEngine:
     global url
     if url is None:
         settings = get_settings()
@@ -23,4 +49,4 @@ async def get_engine(echo: bool = False) -> LazyEngine:
             host=settings.db_host,
             port=settings.db_port,
         )
-    return await engine.get_engine(url, Base, echo=echo)
+    return await engine.get_engine(url, Base, echo=echo, create_tables=create_tables, **engine_kwargs(get_settings()))
@@ -1,9 +1,9 @@
 import enum
 from datetime import datetime, time
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 import sqlalchemy.types as types
-from sqlalchemy import CheckConstraint, ForeignKey, String, UniqueConstraint, func
+from sqlalchemy import CheckConstraint, ForeignKey, Index, String, UniqueConstraint, func, text
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
@@ -83,6 +83,16 @@ class Anime(Base):
 
     qitems: Mapped[List["QItem"]] = relationship(back_populates="anime", cascade="all, delete")
 
+    __table_args__ = (
+        # keyset pagination of anime list, includes columns of list, so that it's read from index only
+        Index(
+            "ix_anime_updated_at_mal_id",
+            "updated_at",
+            "mal_id",
+            postgresql_include=["shiki_title_ro", "shiki_title_ru", "shiki_poster_thumb_url"],
+        ),
+    )
+
 
 class Category(enum.Enum):
     Opening = enum.auto()
@@ -105,6 +115,26 @@ class QItem(BaseWithID):
     __table_args__ = (UniqueConstraint("anime_id", "category", "number", name="_category_number_uc"),)
 
 
+# job of qitems_parser worker, row is kept after processing, so that anime is not parsed again
+class QItemsParserJob(Base):
+    __tablename__ = "qitems_parser_job"
+
+    anime_id: Mapped[int] = mapped_column(ForeignKey("anime.mal_id", ondelete="CASCADE"), primary_key=True)
+    priority: Mapped[int] = mapped_column(default=0)
+    claimed_at: Mapped[Optional[datetime]]
+    processed_at: Mapped[Optional[datetime]]
+
+    __table_args__ = (
+        # matches order of pending jobs in qitems_parser
+        Index(
+            "ix_qitems_parser_job_pending",
+            text("priority DESC"),
+            "created_at",
+            postgresql_where=text("processed_at IS NULL"),
+        ),
+    )
+
+
 class QItemSource(BaseWithID):
     __tablename__ = "qitem_source"
 
@@ -114,12 +144,93 @@ class QItemSource(BaseWithID):
     additional_path: Mapped[Optional[str]]
     added_by: Mapped[str]
     local_fp: Mapped[Optional[str]]
+    mezzanine_fp: Mapped[Optional[str]]  # fast-seeking transcode of local_fp, if created
+    canonical_path: Mapped[Optional[str]] = mapped_column(index=True)  # same for sources of the same video
 
     downloading: Mapped[bool] = mapped_column(default=False)
     invalid: Mapped[bool] = mapped_column(default=False)
 
     qitem: Mapped["QItem"] = relationship(back_populates="sources")
     timings: Mapped[List["QItemSourceTiming"]] = relationship(cascade="all, delete")
+    media: Mapped[Optional["SourceMedia"]] = relationship(back_populates="qitem_source", cascade="all, delete")
+    preview: Mapped[Optional["SourcePreview"]] = relationship(back_populates="qitem_source", cascade="all, delete")
+    retry: Mapped[Optional["QItemSourceRetry"]] = relationship(cascade="all, delete")
+
+
+class FailureClass(enum.Enum):
+    Network = enum.auto()  # no internet access, timeouts, etc.
+    AgeRestricted = enum.auto()  # cookies are needed
+    Cookies = enum.auto()  # failed to extract cookies from browser
+    TorrentClient = enum.auto()  # qBitTorrent is unavailable or failed
+    Metadata = enum.auto()  # magnet link metadata was not received (no peers)
+    Unknown = enum.auto()
+
+
+class QItemSourceRetry(Base):
+    __tablename__ = "qitem_source_retry"
+
+    qitem_source_id: Mapped[int] = mapped_column(ForeignKey("qitem_source.id"), primary_key=True)
+    failure_class: Mapped[FailureClass] = mapped_column(types.Enum(FailureClass))
+    attempts: Mapped[int] = mapped_column(default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(index=True)
+    last_error: Mapped[Optional[str]]
+
+
+# downloaded file, that can be shared by multiple sources (referenced by local_fp)
+class SourceFile(BaseWithID):
+    __tablename__ = "source_file"
+
+    sha256: Mapped[str] = mapped_column(unique=True, index=True)
+    local_fp: Mapped[str] = mapped_column(index=True)
+    size: Mapped[int] = mapped_column(types.BigInteger)
+
+
+class SourceMedia(BaseWithID):
+    __tablename__ = "source_media"
+
+    qitem_source_id: Mapped[int] = mapped_column(ForeignKey("qitem_source.id"), unique=True)
+    local_fp: Mapped[str]  # probed file, differs from source's local_fp if source was redownloaded
+
+    container: Mapped[Optional[str]]
+    duration: Mapped[Optional[float]]  # in seconds
+    bitrate: Mapped[Optional[int]]
+    streams: Mapped[List[Dict[str, Any]]] = mapped_column(postgresql.JSONB, default=list)
+
+    video_codec: Mapped[Optional[str]]
+    width: Mapped[Optional[int]]
+    height: Mapped[Optional[int]]
+    fps: Mapped[Optional[float]]
+    pix_fmt: Mapped[Optional[str]]
+
+    keyframes: Mapped[Optional[int]]
+    mean_keyframe_interval: Mapped[Optional[float]]  # in seconds
+    max_keyframe_interval: Mapped[Optional[float]]  # in seconds
+
+    audio_codec: Mapped[Optional[str]]
+    audio_channels: Mapped[Optional[int]]
+    audio_layout: Mapped[Optional[str]]
+    audio_sample_rate: Mapped[Optional[int]]
+
+    qitem_source: Mapped["QItemSource"] = relationship(back_populates="media")
+
+
+# files for the timing editor, made by preview stage
+class SourcePreview(BaseWithID):
+    __tablename__ = "source_preview"
+
+    qitem_source_id: Mapped[int] = mapped_column(ForeignKey("qitem_source.id"), unique=True)
+    local_fp: Mapped[str]  # previewed file, differs from source's local_fp if source was redownloaded
+
+    proxy_fp: Mapped[str]  # low-resolution short-GOP video
+    peaks_fp: Mapped[Optional[str]]  # audio waveform json, if source has audio
+    sprite_fp: Mapped[Optional[str]]  # sheet of frames, if source has video
+    sprite_interval: Mapped[Optional[float]]  # in seconds
+    sprite_columns: Mapped[Optional[int]]
+    sprite_frames: Mapped[Optional[int]]
+    tile_width: Mapped[Optional[int]]
+    tile_height: Mapped[Optional[int]]
+
+    qitem_source: Mapped["QItemSource"] = relationship(back_populates="preview")
 
 
 class QItemSourceTiming(BaseWithID):
@@ -205,6 +316,47 @@ class AODAnime(Base):
     related_animes: Mapped[List[str]]
 
 
+# finished run of update_aod tool
+class AODImport(BaseWithID):
+    __tablename__ = "aod_import"
+
+    last_update: Mapped[str]
+    added: Mapped[int] = mapped_column(default=0)
+    changed: Mapped[int] = mapped_column(default=0)
+    removed: Mapped[int] = mapped_column(default=0)
+
+
+class ImportStatus(enum.Enum):
+    Pending = enum.auto()
+    Done = enum.auto()
+    Exists = enum.auto()  # anime was already added
+    Failed = enum.auto()
+
+
+# import of animes by mal_ids, made in background by webapp
+class AnimeImport(BaseWithID):
+    __tablename__ = "anime_import"
+
+    total: Mapped[int]
+    done: Mapped[int] = mapped_column(default=0)
+    failed: Mapped[int] = mapped_column(default=0)
+    finished_at: Mapped[Optional[datetime]]
+    error: Mapped[Optional[str]]  # import was interrupted
+
+    items: Mapped[List["AnimeImportItem"]] = relationship(back_populates="anime_import", cascade="all, delete")
+
+
+class AnimeImportItem(Base):
+    __tablename__ = "anime_import_item"
+
+    import_id: Mapped[int] = mapped_column(ForeignKey("anime_import.id", ondelete="CASCADE"), primary_key=True)
+    mal_id: Mapped[int] = mapped_column(primary_key=True)
+    status: Mapped[ImportStatus] = mapped_column(types.Enum(ImportStatus), default=ImportStatus.Pending)
+    error: Mapped[Optional[str]]
+
+    anime_import: Mapped["AnimeImport"] = relationship(back_populates="items")
+
+
 # class ToshoTorrent(Base):
 #     __tablename__ = "tosho_torrent"
 
@@ -1,84 +1,243 @@
+import argparse
 import asyncio
+import codecs
+import json
 import re
+from typing import *
 
-import orjson
-from aiohttp import ClientSession
-from sqlalchemy import delete
+from sqlalchemy import Column, MetaData, Table, select, text
+from sqlalchemy.dialects.postgresql import insert
 
 import hanyuu.database.main as main
-from hanyuu.database.main.models import AnimeType, AODAnime, ReleaseSeason, Status
-from hanyuu.webparse.utils import default_headers
+import hanyuu.webparse.http as http
+from hanyuu.database.main.models import AnimeType, AODAnime, AODImport, ReleaseSeason, Status
 
 mal_regexp = re.compile("^https://myanimelist.net/anime/([0-9]+)$")
 anidb_regexp = re.compile("^https://anidb.net/anime/([0-9]+)")
 url = "https://raw.githubusercontent.com/manami-project/anime-offline-database/master/anime-offline-database-minified.json"
 
+# same columns as aod_anime, used only to build inserts into temporary table
+staging = Table(
+    "aod_anime_staging",
+    MetaData(),
+    *[Column(c.name, c.type) for c in AODAnime.__table__.columns if c.name not in ["created_at", "updated_at"]],
+)
+data_columns = [column.name for column in staging.columns if column.name != "mal_id"]
 
-async def update() -> None:
-    print("Downloading .json...", end=" ")
-    async with ClientSession() as session:
-        async with session.get(url, headers=default_headers) as response:
-            raw_json = await response.read()
-            print(f"downloaded {len(raw_json)} bytes")
-    data = orjson.loads(raw_json)
-
-    print(f"Database version from {data["lastUpdate"]}")
-    print("Processing items...", end=" ")
-    animes = []
-    for item in data["data"]:
-        mal_id = None
-        anidb_id = None
-        for source in item["sources"]:
-            mal_match = mal_regexp.search(source)
-            if mal_match is not None:
-                mal_id = int(mal_match.group(1))
-                continue
-            anidb_match = anidb_regexp.search(source)
-            if anidb_match is not None:
-                anidb_id = int(anidb_match.group(1))
-                continue
-        if mal_id is None or anidb_id is None:
+
+class ArrayStreamParser:
+    """
+    Incremental parser of json object with one large array, f.e. {"lastUpdate": "...", "data": [{...}, {...}]}.
+    Items of array are returned as soon as they are fed, other fields are available in header
+    (fields before array) and trailer (fields after array) when they are fed completely.
+    """
+
+    def __init__(self, key: str) -> None:
+        self.array_start = re.compile(rf'"{re.escape(key)}"\s*:\s*\[')
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.state = "header"
+        self.header: Optional[Dict[str, Any]] = None
+        self.trailer: Optional[Dict[str, Any]] = None
+
+    def feed(self, chunk: str) -> List[Any]:
+        self.buffer += chunk
+        items = []
+        if self.state == "header":
+            match = self.array_start.search(self.buffer)
+            if match is None:
+                return items
+            # replace array with dummy field and close object, to parse fields before it
+            self.header = json.loads(self.buffer[: match.start()] + '"": 0}')
+            self.header.pop("", None)
+            self.buffer = self.buffer[match.end() :]
+            self.state = "items"
+
+        if self.state == "items":
+            pos = 0
+            while True:
+                while pos < len(self.buffer) and self.buffer[pos] in " \t\r\n,":
+                    pos += 1
+                if pos == len(self.buffer):
+                    break
+                if self.buffer[pos] == "]":
+                    self.state = "trailer"
+                    pos += 1
+                    break
+                try:
+                    item, pos = self.decoder.raw_decode(self.buffer, pos)
+                except json.JSONDecodeError:
+                    # item is not fed completely
+                    break
+                items.append(item)
+            self.buffer = self.buffer[pos:]
+
+        if self.state == "trailer":
+            try:
+                self.trailer = json.loads('{"": 0' + self.buffer)
+                self.trailer.pop("", None)
+            except json.JSONDecodeError:
+                pass
+        return items
+
+    def close(self) -> None:
+        if self.trailer is None:
+            raise ValueError(f"Unexpected end of json (state={self.state})")
+
+
+def to_row(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    mal_id = None
+    anidb_id = None
+    for source in item["sources"]:
+        mal_match = mal_regexp.search(source)
+        if mal_match is not None:
+            mal_id = int(mal_match.group(1))
+            continue
+        anidb_match = anidb_regexp.search(source)
+        if anidb_match is not None:
+            anidb_id = int(anidb_match.group(1))
             continue
-        poster_url = (
-            item["picture"]
-            if "no_pic.png" not in item["picture"]
-            else "https://shikimori.one/assets/globals/missing/main.png"
-        )
-        poster_thumb_url = (
-            item["thumbnail"]
-            if "no_pic_thumbnail.png" not in item["thumbnail"]
-            else "https://shikimori.one/assets/globals/missing/preview_animanga.png"
-        )
-        anime = AODAnime(
-            anidb_id=anidb_id,
-            mal_id=mal_id,
-            sources=item["sources"],
-            poster_url=poster_url,
-            poster_thumb_url=poster_thumb_url,
-            title=item["title"],
-            anime_type=AnimeType[item["type"]],
-            status=Status[item["status"]],
-            episodes=item["episodes"],
-            duration=item["duration"]["value"] if "duration" in item else None,
-            tags=item["tags"],
-            synonyms=item["synonyms"],
-            related_animes=item["relatedAnime"],
-            release_year=(item["animeSeason"]["year"] if "year" in item["animeSeason"] else None),
-            release_season=ReleaseSeason[item["animeSeason"]["season"]],
-        )
-
-        animes.append(anime)
-
-    print(f"Found {len(animes)} animes")
-    print("Commiting to database...", end=" ")
+    if mal_id is None or anidb_id is None:
+        return None
+    poster_url = (
+        item["picture"]
+        if "no_pic.png" not in item["picture"]
+        else "https://shikimori.one/assets/globals/missing/main.png"
+    )
+    poster_thumb_url = (
+        item["thumbnail"]
+        if "no_pic_thumbnail.png" not in item["thumbnail"]
+        else "https://shikimori.one/assets/globals/missing/preview_animanga.png"
+    )
+    return dict(
+        anidb_id=anidb_id,
+        mal_id=mal_id,
+        sources=item["sources"],
+        poster_url=poster_url,
+        poster_thumb_url=poster_thumb_url,
+        title=item["title"],
+        anime_type=AnimeType[item["type"]],
+        status=Status[item["status"]],
+        episodes=item["episodes"],
+        duration=item["duration"]["value"] if "duration" in item else None,
+        tags=item["tags"],
+        synonyms=item["synonyms"],
+        related_animes=item["relatedAnime"],
+        release_year=(item["animeSeason"]["year"] if "year" in item["animeSeason"] else None),
+        release_season=ReleaseSeason[item["animeSeason"]["season"]],
+    )
+
+
+class AlreadyUpToDate(Exception):
+    pass
+
+
+async def update(force: bool, batch_size: int) -> None:
     engine = await main.get_engine()
     async with engine.async_session() as session:
-        await session.execute(delete(AODAnime))
-        session.add_all(animes)
-        await session.commit()
+        prev_update = await session.scalar(select(AODImport.last_update).order_by(AODImport.id.desc()).limit(1))
+
+    last_update = None
+
+    def check_last_update(fields: Optional[Dict[str, Any]]) -> None:
+        nonlocal last_update
+        if last_update is None and fields is not None and "lastUpdate" in fields:
+            last_update = fields["lastUpdate"]
+            print(f"Database version from {last_update}")
+            if last_update == prev_update and not force:
+                raise AlreadyUpToDate()
+
+    print("Downloading .json...")
+    parser = ArrayStreamParser("data")
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    n_items, n_animes = 0, 0
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(
+                text("CREATE TEMPORARY TABLE aod_anime_staging (LIKE aod_anime INCLUDING DEFAULTS) ON COMMIT DROP")
+            )
+            # rows with mal_id or anidb_id repeated in database are skipped, as aod_anime can't hold them
+            await conn.execute(text("ALTER TABLE aod_anime_staging ADD PRIMARY KEY (mal_id), ADD UNIQUE (anidb_id)"))
+
+            async with http.stream("GET", url) as response:
+                response.raise_for_status()
+                rows = []
+                async for chunk in response.content.iter_chunked(1 << 16):
+                    items = parser.feed(decoder.decode(chunk))
+                    # stop downloading as soon as version is known to be the same
+                    check_last_update(parser.header)
+                    n_items += len(items)
+                    rows.extend(filter(None, map(to_row, items)))
+                    if len(rows) >= batch_size:
+                        await conn.execute(insert(staging).on_conflict_do_nothing(), rows)
+                        n_animes += len(rows)
+                        rows = []
+                parser.feed(decoder.decode(b"", final=True))
+                parser.close()
+                check_last_update(parser.trailer)
+                if len(rows) > 0:
+                    await conn.execute(insert(staging).on_conflict_do_nothing(), rows)
+                    n_animes += len(rows)
+            n_staged = await conn.scalar(text("SELECT count(*) FROM aod_anime_staging"))
+            print(f"Processed {n_items} items, found {n_animes} animes")
+            if n_staged < n_animes:
+                print(f"Skipped {n_animes - n_staged} animes with repeated mal_id or anidb_id")
+
+            print("Merging into aod_anime...")
+            # old rows stay visible to readers until commit, so table is never empty or half-filled
+            removed = await conn.execute(
+                text(
+                    "DELETE FROM aod_anime a "
+                    "WHERE NOT EXISTS (SELECT 1 FROM aod_anime_staging s WHERE s.mal_id = a.mal_id)"
+                )
+            )
+            # anidb_id moved to other mal_id: old row is removed, so that update and insert don't violate uniqueness
+            reassigned = await conn.execute(
+                text(
+                    "DELETE FROM aod_anime a USING aod_anime_staging s "
+                    "WHERE s.anidb_id = a.anidb_id AND s.mal_id != a.mal_id"
+                )
+            )
+            changed = await conn.execute(
+                text(
+                    f"UPDATE aod_anime a SET {", ".join(f"{c} = s.{c}" for c in data_columns)}, updated_at = now() "
+                    "FROM aod_anime_staging s WHERE s.mal_id = a.mal_id "
+                    f"AND ({", ".join(f"a.{c}" for c in data_columns)}) "
+                    f"IS DISTINCT FROM ({", ".join(f"s.{c}" for c in data_columns)})"
+                )
+            )
+            added = await conn.execute(
+                text(
+                    f"INSERT INTO aod_anime (mal_id, {", ".join(data_columns)}) "
+                    f"SELECT mal_id, {", ".join(data_columns)} FROM aod_anime_staging s "
+                    "WHERE NOT EXISTS (SELECT 1 FROM aod_anime a WHERE a.mal_id = s.mal_id) "
+                    "ON CONFLICT (mal_id) DO NOTHING"
+                )
+            )
+            await conn.execute(
+                insert(AODImport).values(
+                    last_update=last_update or "",
+                    added=added.rowcount,
+                    changed=changed.rowcount,
+                    removed=removed.rowcount + reassigned.rowcount,
+                )
+            )
+    except AlreadyUpToDate:
+        print("Already up to date")
+        return
+    finally:
+        await http.close()
 
+    print(
+        f"Added {added.rowcount}, changed {changed.rowcount}, removed {removed.rowcount}, "
+        f"removed with anidb_id moved to other anime {reassigned.rowcount}"
+    )
     print("Ok")
 
 
 if __name__ == "__main__":
-    asyncio.run(update())
+    parser = argparse.ArgumentParser(description="import anime-offline-database into aod_anime")
+    parser.add_argument("--force", action="store_true", help="import even if lastUpdate has not changed")
+    parser.add_argument("--batch-size", type=int, default=1000, help="number of rows inserted at once")
+    args = parser.parse_args()
+    asyncio.run(update(args.force, args.batch_size))
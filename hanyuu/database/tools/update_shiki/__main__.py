@@ -0,0 +1,50 @@
+import argparse
+import asyncio
+from itertools import batched
+from typing import *
+
+from sqlalchemy import select, update
+
+import hanyuu.database.main as main
+import hanyuu.webparse.http as http
+import hanyuu.webparse.shiki as shiki
+from hanyuu.database.main.models import Anime
+
+
+async def update_all(mal_ids: Optional[List[int]], chunk_size: int) -> None:
+    engine = await main.get_engine()
+    if mal_ids is None:
+        async with engine.async_session() as session:
+            mal_ids = (await session.scalars(select(Anime.mal_id).order_by(Anime.mal_id))).all()
+    print(f"Updating {len(mal_ids)} animes...")
+
+    n_updated, missing = 0, []
+    try:
+        for chunk in batched(mal_ids, chunk_size):
+            animes = await shiki.get_animes(chunk)
+            missing.extend([mal_id for mal_id in chunk if mal_id not in animes])
+            if len(animes) == 0:
+                continue
+            async with engine.async_session() as session:
+                # bulk UPDATE by primary key, executed as one executemany
+                await session.execute(
+                    update(Anime),
+                    [{"mal_id": mal_id, **shiki.anime_columns(anime)} for mal_id, anime in animes.items()],
+                )
+                await session.commit()
+            n_updated += len(animes)
+            print(f"Updated {n_updated}/{len(mal_ids)}")
+    finally:
+        await http.close()
+
+    if len(missing) > 0:
+        print(f"Missing on shikimori: {missing}")
+    print("Ok")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="refresh shiki_* columns of animes from shikimori")
+    parser.add_argument("mal_ids", type=int, nargs="*", help="animes to update (default: all)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="number of animes committed at once")
+    args = parser.parse_args()
+    asyncio.run(update_all(args.mal_ids or None, args.chunk_size))
@@ -39,6 +39,36 @@ async def delete_invalid_records(records: List[Tuple[int, str]], entity: Type[Ba
     logger.info(f"Total records deleted: {n_deleted_records}")
 
 
+async def clear_missing_mezzanines(records: List[Tuple[int, str]]) -> None:
+    engine = await get_engine()
+    missing_ids = [id_ for id_, fp in records if not Path(fp).exists()]
+    async with engine.async_session() as session:
+        await session.execute(update(QItemSource).where(QItemSource.id.in_(missing_ids)).values(mezzanine_fp=None))
+        await session.commit()
+    logger.info(f"Total mezzanines cleared: {len(missing_ids)}")
+
+
+async def delete_unreferenced_source_files() -> None:
+    """
+    Delete registrations of downloaded files, that are not referenced by any source anymore
+    (files themselves are deleted with other unused files).
+    """
+
+    engine = await get_engine()
+    async with engine.async_session() as session:
+        ids_to_delete = (
+            await session.scalars(
+                select(SourceFile.id)
+                .outerjoin(QItemSource, QItemSource.local_fp == SourceFile.local_fp)
+                .group_by(SourceFile.id)
+                .having(func.count(QItemSource.id) == 0)
+            )
+        ).all()
+        await session.execute(delete(SourceFile).where(SourceFile.id.in_(ids_to_delete)))
+        await session.commit()
+    logger.info(f"Total unreferenced source files: {len(ids_to_delete)}")
+
+
 async def delete_duplicated_quizparts() -> None:
     engine = await get_engine()
     async with engine.async_session() as session:
@@ -110,7 +140,9 @@ async def clear_worse_sources() -> None:
             )
         ).all()
 
-        await session.execute(update(QItemSource).where(QItemSource.id.in_(ids_to_clear)).values(local_fp=None))
+        await session.execute(
+            update(QItemSource).where(QItemSource.id.in_(ids_to_clear)).values(local_fp=None, mezzanine_fp=None)
+        )
         await session.commit()
 
     logger.info(f"Cleared videos for sources with ids={ids_to_clear}")
@@ -127,10 +159,27 @@ async def cleanup() -> None:
         ).all()
 
     await clear_worse_sources()
+    await delete_unreferenced_source_files()
+
+    async with engine.async_session() as session:
+        mezzanine_files = (
+            await session.execute(
+                select(QItemSource.id, QItemSource.mezzanine_fp).where(QItemSource.mezzanine_fp.isnot(None))
+            )
+        ).all()
+        preview_files = (
+            await session.execute(
+                select(SourcePreview.id, SourcePreview.proxy_fp, SourcePreview.peaks_fp, SourcePreview.sprite_fp)
+            )
+        ).all()
 
     videos_dir = Path(getenv("resources_dir")) / "videos"
     await delete_invalid_records(source_files, QItemSource)
     delete_unused_files(videos_dir / "sources", [x[1] for x in source_files])
+    await clear_missing_mezzanines(mezzanine_files)
+    delete_unused_files(videos_dir / "mezzanines", [x[1] for x in mezzanine_files])
+    await delete_invalid_records([(x[0], x[1]) for x in preview_files], SourcePreview)
+    delete_unused_files(videos_dir / "previews", [fp for x in preview_files for fp in x[1:] if fp is not None])
     await delete_invalid_records(quizpart_files, QuizPart)
     delete_unused_files(videos_dir / "quizparts", [x[1] for x in quizpart_files])
 
@@ -1,7 +1,17 @@
-from typing import Dict, Type
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncContextManager, Dict, Type
 
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import QueuePool
+
+
+@dataclass
+class PoolStats:
+    connects: int = 0  # new database connections
+    checkouts: int = 0
+    invalidations: int = 0  # connections dropped after errors or failed pre-ping
 
 
 class LazyEngine:
@@ -10,16 +20,43 @@ class LazyEngine:
         self.url = url
         self.base = base
 
-    def connect(self, echo: bool = False) -> None:
-        self._engine = create_async_engine(url=self.url, echo=echo)
+    def connect(self, echo: bool = False, **kwargs: Any) -> None:
+        self._engine = create_async_engine(url=self.url, echo=echo, **kwargs)
         self._async_session = async_sessionmaker(self._engine, class_=AsyncSession)
+        self.stats = PoolStats()
+        pool = self._engine.sync_engine.pool
+        event.listen(pool, "connect", lambda *_: self.count("connects"))
+        event.listen(pool, "checkout", lambda *_: self.count("checkouts"))
+        event.listen(pool, "invalidate", lambda *_: self.count("invalidations"))
         self.connected = True
 
+    def count(self, name: str) -> None:
+        setattr(self.stats, name, getattr(self.stats, name) + 1)
+
+    def pool_stats(self) -> Dict[str, Any]:
+        pool = self._engine.sync_engine.pool
+        stats = {"pool": type(pool).__name__, **asdict(self.stats)}
+        if isinstance(pool, QueuePool):
+            stats.update(
+                size=pool.size(), checked_in=pool.checkedin(), checked_out=pool.checkedout(), overflow=pool.overflow()
+            )
+        return stats
+
     def async_session(self, **kwargs) -> AsyncSession:
         defaults = {"expire_on_commit": False}
         defaults.update(kwargs)
         return self._async_session(**defaults)
 
+    def begin(self) -> AsyncContextManager[AsyncConnection]:
+        return self._engine.begin()
+
+    def connection(self) -> AsyncContextManager[AsyncConnection]:
+        return self._engine.connect()
+
+    async def dispose(self) -> None:
+        await self._engine.dispose()
+        self.connected = False
+
     async def create_tables(self) -> None:
         async with self._engine.begin() as conn:
             await conn.run_sync(self.base.metadata.create_all)
@@ -36,11 +73,25 @@ class LazyEngine:
 engines: Dict[str, LazyEngine] = {}
 
 
-async def get_engine(url: str, base: Type[DeclarativeBase], echo: bool = False) -> None:
+async def get_engine(
+    url: str, base: Type[DeclarativeBase], echo: bool = False, create_tables: bool = True, **kwargs: Any
+) -> LazyEngine:
+    """
+    Engine for url, created on first call with given create_async_engine kwargs.
+    """
+
     global engines
     if url not in engines:
         engine = LazyEngine(url, base)
-        engine.connect(echo=echo)
-        await engine.create_tables()
+        engine.connect(echo=echo, **kwargs)
+        if create_tables:
+            await engine.create_tables()
         engines[url] = engine
     return engines[url]
+
+
+async def dispose_engines() -> None:
+    global engines
+    for engine in engines.values():
+        await engine.dispose()
+    engines = {}
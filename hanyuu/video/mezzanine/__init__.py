@@ -0,0 +1 @@
+from .transcode import MezzanineFormat, transcode
@@ -0,0 +1,51 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import ffmpeg
+
+
+@dataclass
+class MezzanineFormat:
+    height: int = 720  # maximum video height, smaller videos are not upscaled
+    keyframe_interval: float = 1  # seconds between forced keyframes (short GOP for fast seeking)
+    vcodec: str = "libx264"
+    preset: str = "veryfast"
+    crf: int = 18
+    pix_fmt: str = "yuv420p"  # 8-bit 4:2:0, cheap to decode
+    acodec: str = "aac"
+    audio_bitrate: str = "192k"
+    audio_channels: int = 2
+    audio_rate: int = 48000
+    extension: str = "mp4"
+
+
+def transcode(input_fp: str, output_fp: str, fmt: Optional[MezzanineFormat] = None) -> None:
+    """
+    Transcode video into fast-seeking mezzanine format.
+    """
+
+    fmt = fmt if fmt is not None else MezzanineFormat()
+    Path(output_fp).parent.mkdir(parents=True, exist_ok=True)
+
+    source = ffmpeg.input(str(input_fp))
+
+    video = source.video.filter("scale", -2, f"min({fmt.height},ih)")
+    output = ffmpeg.output(
+        video,
+        source.audio,
+        str(output_fp),
+        vcodec=fmt.vcodec,
+        preset=fmt.preset,
+        crf=fmt.crf,
+        pix_fmt=fmt.pix_fmt,
+        force_key_frames=f"expr:gte(t,n_forced*{fmt.keyframe_interval})",
+        acodec=fmt.acodec,
+        audio_bitrate=fmt.audio_bitrate,
+        ac=fmt.audio_channels,
+        ar=fmt.audio_rate,
+        movflags="+faststart",
+        nostats=None,
+        loglevel="error",
+    )
+    output.run(overwrite_output=True)
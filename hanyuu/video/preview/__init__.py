@@ -0,0 +1 @@
+from .preview import PreviewFormat, make_peaks, make_proxy, make_sprite
@@ -0,0 +1,92 @@
+import math
+import subprocess
+import sys
+from array import array
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import ffmpeg
+import orjson
+
+from hanyuu.video.proxy import ProxyFormat, proxy_args
+
+
+@dataclass
+class PreviewFormat:
+    proxy: ProxyFormat = field(default_factory=ProxyFormat)
+    peaks_sample_rate: int = 8000  # audio is downsampled before peaks are found
+    peaks_per_second: int = 50
+    sprite_interval: float = 2  # seconds between sprite frames, multiple of proxy keyframe interval
+    tile_width: int = 160
+    sprite_columns: int = 10
+
+
+def make_proxy(input_fp: str, output_fp: str, fmt: Optional[PreviewFormat] = None) -> None:
+    """
+    Low-resolution, low-bitrate, short-GOP copy of video for the timing editor.
+    """
+
+    fmt = fmt if fmt is not None else PreviewFormat()
+    Path(output_fp).parent.mkdir(parents=True, exist_ok=True)
+    args = proxy_args(input_fp, output_fp=output_fp, fmt=fmt.proxy)
+    process = subprocess.run(args, capture_output=True)
+    if process.returncode != 0:
+        raise ffmpeg.Error(args[0], process.stdout, process.stderr)
+
+
+def make_peaks(input_fp: str, output_fp: str, fmt: Optional[PreviewFormat] = None) -> None:
+    """
+    Audio waveform as min/max pairs of 8-bit samples, in audiowaveform json format (understood by peaks.js).
+    """
+
+    fmt = fmt if fmt is not None else PreviewFormat()
+    pcm, _ = (
+        ffmpeg.input(str(input_fp))
+        .output("pipe:", format="s16le", acodec="pcm_s16le", ac=1, ar=fmt.peaks_sample_rate)
+        .run(capture_stdout=True, capture_stderr=True)
+    )
+    samples = array("h")
+    samples.frombytes(pcm[: len(pcm) // 2 * 2])
+    if sys.byteorder == "big":
+        samples.byteswap()
+
+    samples_per_pixel = fmt.peaks_sample_rate // fmt.peaks_per_second
+    data = []
+    for i in range(0, len(samples), samples_per_pixel):
+        bucket = samples[i : i + samples_per_pixel]
+        data += [min(bucket) >> 8, max(bucket) >> 8]
+    peaks = {
+        "version": 2,
+        "channels": 1,
+        "sample_rate": fmt.peaks_sample_rate,
+        "samples_per_pixel": samples_per_pixel,
+        "bits": 8,
+        "length": len(data) // 2,
+        "data": data,
+    }
+    Path(output_fp).parent.mkdir(parents=True, exist_ok=True)
+    Path(output_fp).write_bytes(orjson.dumps(peaks))
+
+
+def make_sprite(
+    input_fp: str, output_fp: str, duration: float, tile_height: int, fmt: Optional[PreviewFormat] = None
+) -> int:
+    """
+    Sheet of frames taken every `sprite_interval` seconds, row by row. Returns number of frames.
+    Only keyframes are decoded, so input should be proxy with keyframe interval dividing `sprite_interval`.
+    """
+
+    fmt = fmt if fmt is not None else PreviewFormat()
+    n_frames = max(math.ceil(duration / fmt.sprite_interval), 1)
+    n_rows = math.ceil(n_frames / fmt.sprite_columns)
+    Path(output_fp).parent.mkdir(parents=True, exist_ok=True)
+    (
+        ffmpeg.input(str(input_fp), skip_frame="nokey")
+        .video.filter("fps", f"1/{fmt.sprite_interval}")
+        .filter("scale", fmt.tile_width, tile_height)
+        .filter("tile", f"{fmt.sprite_columns}x{n_rows}")
+        .output(str(output_fp), vframes=1, qscale=5, loglevel="error")
+        .run(overwrite_output=True, capture_stderr=True)
+    )
+    return n_frames
@@ -0,0 +1 @@
+from .probe import has_video_and_audio, probe
@@ -0,0 +1,105 @@
+from fractions import Fraction
+from typing import Any, Dict, List, Optional
+
+import ffmpeg
+
+
+def parse_rate(rate: Optional[str]) -> Optional[float]:
+    try:
+        value = float(Fraction(rate))
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    return value if value > 0 else None
+
+
+def parse_float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def keyframes_summary(path: str) -> Dict[str, Any]:
+    """
+    Count keyframes of first video stream and measure intervals between them.
+    Only packets are read, so video is not decoded.
+    """
+
+    result = ffmpeg.probe(path, select_streams="v:0", show_entries="packet=pts_time,flags")
+    times = [
+        t
+        for t in (parse_float(p.get("pts_time")) for p in result.get("packets", []) if "K" in p.get("flags", ""))
+        if t is not None
+    ]
+    times.sort()
+    intervals = [b - a for a, b in zip(times, times[1:])]
+    return {
+        "keyframes": len(times),
+        "mean_keyframe_interval": sum(intervals) / len(intervals) if len(intervals) > 0 else None,
+        "max_keyframe_interval": max(intervals, default=None),
+    }
+
+
+def probe(path: str, keyframes: bool = True) -> Dict[str, Any]:
+    """
+    Probe media file, and return its metadata as SourceMedia columns.
+    Raises ffmpeg.Error, if file can't be probed.
+    """
+
+    result = ffmpeg.probe(path)
+    fmt = result.get("format", {})
+    streams: List[Dict[str, Any]] = result.get("streams", [])
+    video = next(filter(lambda s: s.get("codec_type") == "video", streams), None)
+    audio = next(filter(lambda s: s.get("codec_type") == "audio", streams), None)
+
+    media = {
+        "container": fmt.get("format_name"),
+        "duration": parse_float(fmt.get("duration")),
+        "bitrate": int(fmt["bit_rate"]) if fmt.get("bit_rate", "").isdigit() else None,
+        "streams": [
+            {
+                "index": s.get("index"),
+                "codec_type": s.get("codec_type"),
+                "codec_name": s.get("codec_name"),
+                "language": s.get("tags", {}).get("language"),
+            }
+            for s in streams
+        ],
+        "video_codec": None,
+        "width": None,
+        "height": None,
+        "fps": None,
+        "pix_fmt": None,
+        "audio_codec": None,
+        "audio_channels": None,
+        "audio_layout": None,
+        "audio_sample_rate": None,
+        "keyframes": None,
+        "mean_keyframe_interval": None,
+        "max_keyframe_interval": None,
+    }
+
+    if video is not None:
+        media |= {
+            "video_codec": video.get("codec_name"),
+            "width": video.get("width"),
+            "height": video.get("height"),
+            "fps": parse_rate(video.get("avg_frame_rate")) or parse_rate(video.get("r_frame_rate")),
+            "pix_fmt": video.get("pix_fmt"),
+        }
+        if keyframes:
+            media |= keyframes_summary(path)
+
+    if audio is not None:
+        media |= {
+            "audio_codec": audio.get("codec_name"),
+            "audio_channels": audio.get("channels"),
+            "audio_layout": audio.get("channel_layout"),
+            "audio_sample_rate": int(audio["sample_rate"]) if str(audio.get("sample_rate", "")).isdigit() else None,
+        }
+
+    return media
+
+
+def has_video_and_audio(media: Dict[str, Any]) -> bool:
+    return media["video_codec"] is not None and media["audio_codec"] is not None
@@ -0,0 +1 @@
+from .proxy import ProxyFormat, proxy_args
@@ -0,0 +1,54 @@
+from dataclasses import dataclass
+from typing import List, Optional
+
+import ffmpeg
+
+
+@dataclass
+class ProxyFormat:
+    height: int = 360  # maximum video height, smaller videos are not upscaled
+    keyframe_interval: float = 1  # seconds between forced keyframes
+    vcodec: str = "libx264"
+    preset: str = "ultrafast"  # transcoded while being watched, so speed is more important than size
+    crf: int = 30
+    maxrate: str = "600k"
+    bufsize: str = "1200k"
+    pix_fmt: str = "yuv420p"
+    acodec: str = "aac"
+    audio_bitrate: str = "96k"
+    audio_channels: int = 2
+
+
+def proxy_args(
+    input_fp: str, start: float = 0, output_fp: str = "pipe:1", fmt: Optional[ProxyFormat] = None
+) -> List[str]:
+    """
+    ffmpeg command line for low-bitrate preview of video, starting from `start` seconds.
+    Output to pipe is fragmented mp4, so that it can be played while being written.
+    """
+
+    fmt = fmt if fmt is not None else ProxyFormat()
+    # seeking before input is fast (by keyframes)
+    source = ffmpeg.input(str(input_fp), ss=start) if start > 0 else ffmpeg.input(str(input_fp))
+
+    video = source.video.filter("scale", -2, f"min({fmt.height},ih)")
+    output = ffmpeg.output(
+        video,
+        source["a?"],  # video may have no audio
+        str(output_fp),
+        format="mp4",
+        vcodec=fmt.vcodec,
+        preset=fmt.preset,
+        crf=fmt.crf,
+        maxrate=fmt.maxrate,
+        bufsize=fmt.bufsize,
+        pix_fmt=fmt.pix_fmt,
+        force_key_frames=f"expr:gte(t,n_forced*{fmt.keyframe_interval})",
+        acodec=fmt.acodec,
+        audio_bitrate=fmt.audio_bitrate,
+        ac=fmt.audio_channels,
+        movflags="frag_keyframe+empty_moov+default_base_moof" if output_fp == "pipe:1" else "+faststart",
+        nostats=None,
+        loglevel="error",
+    )
+    return output.compile(overwrite_output=True)
@@ -3,13 +3,12 @@ from pathlib import Path
 from tempfile import NamedTemporaryFile
 from typing import Callable, Optional
 
-import aiohttp
 import ffmpeg
 
+import hanyuu.webparse.http as http
 from hanyuu.config import getenv
 from hanyuu.database.main.connection import get_engine
 from hanyuu.database.main.models import Category, QItemDifficulty, QItemSourceTiming
-from hanyuu.webparse.utils import default_headers
 
 from .base import VideoMakerBase
 
@@ -98,17 +97,20 @@ class VideoMaker(VideoMakerBase):
         poster_box_fp = Path(getenv("static_dir")) / "png" / "poster_box.png"
 
         poster_file = NamedTemporaryFile("w+b", delete_on_close=False)
-        async with aiohttp.ClientSession(headers=default_headers) as session:
-            async with session.get(anime.shiki_poster_url) as response:
-                poster_file.write(await response.read())
+        response = await http.get(anime.shiki_poster_url)
+        response.raise_for_status()
+        poster_file.write(response.body)
         poster_file.close()
 
         vt = self.vtiming
         vp = self.vpos
 
+        # prefer fast-seeking mezzanine, if it exists
+        input_fp = source.mezzanine_fp or source.local_fp
+
         countdown = ffmpeg.input(str(countdown_fp.resolve()))
-        reveal = ffmpeg.input(source.local_fp, ss=timing.reveal_start, t=vt.rD)
-        guess = ffmpeg.input(source.local_fp, ss=timing.guess_start, t=vt.gD)
+        reveal = ffmpeg.input(input_fp, ss=timing.reveal_start, t=vt.rD)
+        guess = ffmpeg.input(input_fp, ss=timing.guess_start, t=vt.gD)
         poster = ffmpeg.input(poster_file.name, loop=1, t=vt.rD)
         poster_box = ffmpeg.input(poster_box_fp.resolve(), loop=1, t=vt.rD)
 
@@ -20,7 +20,8 @@ class OneSecVideoMaker(VideoMakerBase):
             qitem = await source.awaitable_attrs.qitem
 
         font_fp = (Path(getenv("static_dir")) / "ttf" / "VOGUE.TTF").resolve()
-        input_fp = Path(source.local_fp).resolve()
+        # prefer fast-seeking mezzanine, if it exists
+        input_fp = Path(source.mezzanine_fp or source.local_fp).resolve()
         output_fp = Path(output_fp).resolve()
         output_fp.parent.mkdir(parents=True, exist_ok=True)
 
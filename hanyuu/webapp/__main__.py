@@ -1,6 +1,50 @@
+import argparse
+import asyncio
+import copy
+from typing import *
+
 import uvicorn
 
-from . import app
+from hanyuu.database.main.connection import get_engine
+from hanyuu.utils.engine import dispose_engines
+from hanyuu.webapp import events
+
+
+async def create_tables() -> None:
+    await get_engine()
+    await events.install_triggers()
+    await dispose_engines()
+
+
+def log_config() -> Dict[str, Any]:
+    # webapp modules log (events listener, imports, pool stats) through uvicorn handler
+    config = copy.deepcopy(uvicorn.config.LOGGING_CONFIG)
+    config["loggers"]["hanyuu"] = {"handlers": ["default"], "level": "INFO"}
+    return config
+
 
 if __name__ == "__main__":
-    uvicorn.run(app)
+    parser = argparse.ArgumentParser(description="serve webapp")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="number of processes, each with its own pool")
+    parser.add_argument("--reload", action="store_true", help="restart on code changes, for development")
+    parser.add_argument(
+        "--graceful-timeout",
+        type=float,
+        default=10,
+        help="seconds to wait for open requests (event streams never end) on shutdown",
+    )
+    args = parser.parse_args()
+
+    # once, so that workers don't run DDL concurrently or on requests
+    asyncio.run(create_tables())
+    uvicorn.run(
+        "hanyuu.webapp:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        reload=args.reload,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        log_config=log_config(),
+    )
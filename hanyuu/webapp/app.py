@@ -1,12 +1,47 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import *
+
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 
+import hanyuu.webparse.http as http
 from hanyuu.config import getenv
+from hanyuu.database.main.connection import get_engine
+from hanyuu.utils.engine import LazyEngine, dispose_engines
 
+from . import events, imports
 from .routers import *
 from .routers.utils import redirect_to
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+
+async def log_pool_stats(engine: LazyEngine, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        logger.info(f"Pool of worker pid={os.getpid()}: {engine.pool_stats()}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # pool is created once per worker process, tables are created by __main__ before workers start
+    engine = await get_engine(create_tables=False)
+    interval = getenv("db_pool_log_interval")
+    pool_logger = asyncio.create_task(log_pool_stats(engine, interval)) if interval > 0 else None
+    await imports.resume()
+    yield
+    if pool_logger is not None:
+        pool_logger.cancel()
+    await imports.stop()
+    await events.stop()
+    await http.close()
+    await dispose_engines()
+
+
+app = FastAPI(lifespan=lifespan)
 redirect_to(app, "/", "read_animes")
 app.mount("/static", StaticFiles(directory=getenv("static_dir")), name="static")
 
@@ -15,3 +50,4 @@ app.include_router(qitems.router)
 app.include_router(difficulties.router)
 app.include_router(sources.router)
 app.include_router(timings.router)
+app.include_router(stats.router)
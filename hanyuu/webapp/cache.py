@@ -0,0 +1,114 @@
+"""
+Cache of rendered pages. Page is keyed by its url and version: counts and max updated_at
+of rows it is rendered from, so repeated views cost one version query, and clients with
+up to date copy get 304 without rendering at all.
+"""
+
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from typing import *
+
+from fastapi import Request, Response
+from sqlalchemy import func, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from hanyuu.database.main.models import (
+    Anime,
+    QItem,
+    QItemDifficulty,
+    QItemSource,
+    QItemSourceTiming,
+    QuizPart,
+    SourceMedia,
+    SourcePreview,
+)
+
+max_entries = 256
+
+
+@dataclass
+class Entry:
+    etag: str
+    body: bytes
+    media_type: Optional[str]
+
+
+entries: OrderedDict[str, Entry] = OrderedDict()
+
+
+def invalidate() -> None:
+    entries.clear()
+
+
+async def invalidate_on_write(request: Request) -> AsyncIterator[None]:
+    """
+    Router dependency, that drops cached pages after create, update and delete requests.
+    """
+
+    yield
+    if request.method not in ["GET", "HEAD"]:
+        invalidate()
+
+
+async def animes_version(session: AsyncSession) -> Tuple[Any, ...]:
+    return tuple((await session.execute(select(func.count(), func.max(Anime.updated_at)))).one())
+
+
+async def anime_version(session: AsyncSession, mal_id: int) -> Tuple[Any, ...]:
+    sources = select(QItemSource.id).join(QItem).where(QItem.anime_id == mal_id)
+    rows = union_all(
+        select(Anime.updated_at).where(Anime.mal_id == mal_id),
+        select(QItem.updated_at).where(QItem.anime_id == mal_id),
+        select(QItemDifficulty.updated_at).join(QItem).where(QItem.anime_id == mal_id),
+        select(QItemSource.updated_at).where(QItemSource.id.in_(sources)),
+        select(QItemSourceTiming.updated_at).where(QItemSourceTiming.qitem_source_id.in_(sources)),
+        select(QuizPart.updated_at).join(QItemSourceTiming).where(QItemSourceTiming.qitem_source_id.in_(sources)),
+        select(SourceMedia.updated_at).where(SourceMedia.qitem_source_id.in_(sources)),
+        select(SourcePreview.updated_at).where(SourcePreview.qitem_source_id.in_(sources)),
+    ).subquery()
+    return tuple((await session.execute(select(func.count(), func.max(rows.c.updated_at)))).one())
+
+
+def not_modified(request: Request, etag: str, updated_at: Optional[datetime]) -> bool:
+    # etag also changes on deletion, so date is checked only if client has no etag
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or updated_at is None:
+        return False
+    try:
+        return updated_at.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+
+
+async def respond(request: Request, version: Tuple[Any, ...], render: Callable[[], Awaitable[Response]]) -> Response:
+    """
+    Cached page for the given version (last item of which is max updated_at), or rendered one.
+    """
+
+    key = str(request.url)
+    etag = '"' + hashlib.sha1(repr((key, version)).encode()).hexdigest() + '"'
+    updated_at = version[-1]
+    headers = {"etag": etag, "cache-control": "no-cache"}
+    if updated_at is not None:
+        headers["last-modified"] = formatdate(updated_at.timestamp(), usegmt=True)
+    if not_modified(request, etag, updated_at):
+        return Response(status_code=304, headers=headers)
+
+    entry = entries.get(key)
+    if entry is not None and entry.etag == etag:
+        entries.move_to_end(key)
+    else:
+        response = await render()
+        if response.status_code != 200:
+            return response
+        entry = entries[key] = Entry(etag=etag, body=response.body, media_type=response.media_type)
+        entries.move_to_end(key)
+        while len(entries) > max_entries:
+            entries.popitem(last=False)
+    return Response(content=entry.body, media_type=entry.media_type, headers=headers)
@@ -0,0 +1,173 @@
+"""
+Row changes of anime pages, pushed to open pages as server-sent events.
+Workers run in other processes, so changes are published by database triggers with NOTIFY,
+and webapp LISTENs on one connection and fans them out to subscribers of the changed anime.
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from typing import *
+
+import orjson
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from hanyuu.database.main.connection import get_engine
+
+logger = logging.getLogger(__name__)
+
+channel = "hanyuu_changes"
+retry_interval = 5  # seconds before reconnecting listener, also sent to clients
+keepalive_interval = 15  # seconds between comments, so that proxies don't close idle streams
+max_queued = 256  # changes waiting for slow client, before it is told to reload
+
+# Change is sent as {"kind", "id", "op", "parent_kind", "parent_id", "anime_id"}, where kind is prefix of router
+# that renders changed item. Media, preview and quiz parts are shown inside their source and timing,
+# so their changes are updates of those.
+trigger_function = f"""
+CREATE OR REPLACE FUNCTION hanyuu_notify_change() RETURNS trigger AS $$
+DECLARE
+    r record;
+    kind text;
+    item_id integer;
+    op text;
+    parent_kind text;
+    parent_id integer;
+    source_id integer;
+    anime integer;
+BEGIN
+    IF TG_OP = 'DELETE' THEN r := OLD; ELSE r := NEW; END IF;
+    op := TG_OP;
+    CASE TG_TABLE_NAME
+    WHEN 'qitem_source' THEN
+        kind := 'sources'; item_id := r.id; parent_kind := 'qitems'; parent_id := r.qitem_id; source_id := r.id;
+    WHEN 'source_media', 'source_preview' THEN
+        kind := 'sources'; item_id := r.qitem_source_id; op := 'UPDATE'; source_id := r.qitem_source_id;
+    WHEN 'qitem_source_timing' THEN
+        kind := 'timings'; item_id := r.id; parent_kind := 'sources'; parent_id := r.qitem_source_id;
+        source_id := r.qitem_source_id;
+    WHEN 'quiz_part' THEN
+        kind := 'timings'; item_id := r.timing_id; op := 'UPDATE';
+        SELECT qitem_source_id INTO source_id FROM qitem_source_timing WHERE id = r.timing_id;
+    WHEN 'qitem_difficulty' THEN
+        kind := 'difficulties'; item_id := r.id; parent_kind := 'qitems'; parent_id := r.qitem_id;
+    END CASE;
+    IF TG_TABLE_NAME IN ('qitem_source', 'qitem_difficulty') THEN
+        -- deleted row can't be joined, its qitem still exists
+        SELECT qitem.anime_id INTO anime FROM qitem WHERE qitem.id = r.qitem_id;
+    ELSE
+        SELECT qitem.anime_id INTO anime
+        FROM qitem_source JOIN qitem ON qitem.id = qitem_source.qitem_id
+        WHERE qitem_source.id = source_id;
+    END IF;
+    IF anime IS NOT NULL THEN
+        PERFORM pg_notify('{channel}', json_build_object(
+            'kind', kind, 'id', item_id, 'op', op, 'parent_kind', parent_kind, 'parent_id', parent_id, 'anime_id', anime
+        )::text);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+tables = ["qitem_source", "source_media", "source_preview", "qitem_source_timing", "quiz_part", "qitem_difficulty"]
+
+# anime id -> queues of its open pages
+subscribers: DefaultDict[int, Set[asyncio.Queue]] = defaultdict(set)
+listener: Optional[asyncio.Task] = None
+
+
+async def install_triggers() -> None:
+    """
+    Called by webapp launcher before workers start, as it locks tracked tables.
+    """
+
+    engine = await get_engine()
+    async with engine.begin() as conn:
+        await create_triggers(conn)
+
+
+async def create_triggers(conn: AsyncConnection) -> None:
+    await conn.execute(text(trigger_function))
+    for table in tables:
+        await conn.execute(
+            text(
+                f"CREATE OR REPLACE TRIGGER hanyuu_notify_change AFTER INSERT OR UPDATE OR DELETE ON {table} "
+                "FOR EACH ROW EXECUTE FUNCTION hanyuu_notify_change()"
+            )
+        )
+
+
+def publish(connection: Any, pid: int, channel: str, payload: str) -> None:
+    change = orjson.loads(payload)
+    for queue in subscribers.get(change["anime_id"], ()):
+        try:
+            queue.put_nowait(change)
+        except asyncio.QueueFull:
+            queue.get_nowait()
+            queue.put_nowait({"kind": "reload"})
+
+
+async def listen() -> None:
+    engine = await get_engine()
+    reconnect = False
+    while True:
+        try:
+            async with engine.connection() as conn:
+                raw = (await conn.get_raw_connection()).driver_connection
+                closed = asyncio.Event()
+                raw.add_termination_listener(lambda _: closed.set())
+                await raw.add_listener(channel, publish)
+                if reconnect:
+                    # changes made while listener was down are lost, so pages are reloaded
+                    notify_all({"kind": "reload"})
+                await closed.wait()
+        except Exception:
+            logger.exception(f"Listening to {channel} failed, reconnecting in {retry_interval}s")
+        reconnect = True
+        await asyncio.sleep(retry_interval)
+
+
+async def stop() -> None:
+    global listener
+    if listener is not None:
+        listener.cancel()
+        await asyncio.gather(listener, return_exceptions=True)
+        listener = None
+
+
+def notify_all(change: Dict[str, Any]) -> None:
+    for queues in subscribers.values():
+        for queue in queues:
+            if not queue.full():
+                queue.put_nowait(change)
+
+
+def subscribe(anime_id: int) -> asyncio.Queue:
+    global listener
+    if listener is None or listener.done():
+        listener = asyncio.create_task(listen())
+    queue = asyncio.Queue(maxsize=max_queued)
+    subscribers[anime_id].add(queue)
+    return queue
+
+
+def unsubscribe(anime_id: int, queue: asyncio.Queue) -> None:
+    subscribers[anime_id].discard(queue)
+    if len(subscribers[anime_id]) == 0:
+        del subscribers[anime_id]
+
+
+async def stream(anime_id: int) -> AsyncIterator[str]:
+    queue = subscribe(anime_id)
+    try:
+        yield f"retry: {retry_interval * 1000}\n\n"
+        while True:
+            try:
+                change = await asyncio.wait_for(queue.get(), keepalive_interval)
+            except TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: change\ndata: {orjson.dumps(change).decode()}\n\n"
+    finally:
+        unsubscribe(anime_id, queue)
@@ -0,0 +1,183 @@
+"""
+Background import of animes by mal_ids. Import and its items are stored in database,
+so that progress can be polled by status url.
+"""
+
+import asyncio
+import logging
+from itertools import batched
+from typing import *
+
+from sqlalchemy import func, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import hanyuu.webparse.anidb as anidb
+import hanyuu.webparse.shiki as shiki
+from hanyuu.database.main.connection import get_engine
+from hanyuu.database.main.models import Anime, AnimeImport, AnimeImportItem, AODAnime, ImportStatus
+
+logger = logging.getLogger(__name__)
+
+# animes fetched from shikimori with one query and committed together
+batch_size = shiki.tools.max_batch_size
+
+# running imports, referenced so that tasks are not garbage collected
+tasks: Set[asyncio.Task] = set()
+# advisory lock of running import, so that import resumed by several webapp workers runs in one of them
+lock_key = "anime_import"
+
+
+async def create(session: AsyncSession, mal_ids: Iterable[int]) -> AnimeImport:
+    mal_ids = list(dict.fromkeys(mal_ids))
+    existing = set(await session.scalars(select(Anime.mal_id).where(Anime.mal_id.in_(mal_ids))))
+    anime_import = AnimeImport(
+        total=len(mal_ids),
+        done=len(existing),
+        items=[
+            AnimeImportItem(mal_id=mal_id, status=ImportStatus.Exists if mal_id in existing else ImportStatus.Pending)
+            for mal_id in mal_ids
+        ],
+    )
+    session.add(anime_import)
+    await session.commit()
+    return anime_import
+
+
+def start(import_id: int) -> None:
+    task = asyncio.create_task(run(import_id))
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+
+
+async def resume() -> None:
+    """
+    Start imports left unfinished by crashed workers.
+    """
+
+    engine = await get_engine()
+    async with engine.async_session() as session:
+        import_ids = list(await session.scalars(select(AnimeImport.id).where(AnimeImport.finished_at.is_(None))))
+    for import_id in import_ids:
+        start(import_id)
+
+
+async def stop() -> None:
+    running = list(tasks)
+    for task in running:
+        task.cancel()
+    await asyncio.gather(*running, return_exceptions=True)
+
+
+async def import_batch(session: AsyncSession, mal_ids: List[int]) -> Dict[int, Optional[str]]:
+    """
+    Add animes with their qitems, returns error (or None) by mal_id.
+    """
+
+    # shikimori and AOD are independent, anidb pages are fetched (or taken from cache) concurrently after them
+    shiki_animes, aod_anidb_ids = await asyncio.gather(
+        shiki.get_animes(mal_ids),
+        session.execute(select(AODAnime.mal_id, AODAnime.anidb_id).where(AODAnime.mal_id.in_(mal_ids))),
+    )
+    aod_anidb_ids = dict(aod_anidb_ids.all())
+
+    errors: Dict[int, Optional[str]] = {}
+    anidb_ids = {}
+    for mal_id in mal_ids:
+        if mal_id not in shiki_animes:
+            errors[mal_id] = "Missing on shikimori"
+            continue
+        anidb_id = aod_anidb_ids.get(mal_id, shiki_animes[mal_id].get("anidb_id", None))
+        if anidb_id is None:
+            errors[mal_id] = "Couldn't find anidb_id (missing from AOD, not in shiki external links)"
+            continue
+        anidb_ids[mal_id] = anidb_id
+
+    pages = await asyncio.gather(*map(anidb.Page.from_id, anidb_ids.values()), return_exceptions=True)
+    for (mal_id, anidb_id), page in zip(anidb_ids.items(), pages):
+        if isinstance(page, Exception):
+            errors[mal_id] = f"Failed to get anidb page {anidb_id}: {page!r}"
+            continue
+        anime = Anime(
+            mal_id=mal_id,
+            anidb_id=anidb_id,
+            **shiki.anime_columns(shiki_animes[mal_id]),
+            qitems=page.qitems,
+        )
+        try:
+            # savepoint, so that one conflicting anime doesn't fail the whole batch
+            async with session.begin_nested():
+                session.add(anime)
+        except IntegrityError as e:
+            errors[mal_id] = e._message()
+            continue
+        errors[mal_id] = None
+    return errors
+
+
+async def run(import_id: int) -> None:
+    engine = await get_engine()
+    params = {"key": lock_key, "id": import_id}
+    async with engine.connection() as conn:
+        # session level lock is held until import ends or its worker dies
+        if not await conn.scalar(text("SELECT pg_try_advisory_lock(hashtext(:key), :id)"), params):
+            return
+        await conn.commit()
+        try:
+            await run_locked(import_id)
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(hashtext(:key), :id)"), params)
+            await conn.commit()
+
+
+async def run_locked(import_id: int) -> None:
+    engine = await get_engine()
+    async with engine.async_session() as session:
+        if await session.scalar(select(AnimeImport.finished_at).where(AnimeImport.id == import_id)) is not None:
+            # finished by other worker before lock was taken
+            return
+        pending = list(
+            await session.scalars(
+                select(AnimeImportItem.mal_id).where(
+                    AnimeImportItem.import_id == import_id, AnimeImportItem.status == ImportStatus.Pending
+                )
+            )
+        )
+
+    error = None
+    try:
+        for batch in batched(pending, batch_size):
+            async with engine.async_session() as session:
+                errors = await import_batch(session, list(batch))
+                await session.execute(
+                    update(AnimeImportItem),
+                    [
+                        {
+                            "import_id": import_id,
+                            "mal_id": mal_id,
+                            "status": ImportStatus.Done if message is None else ImportStatus.Failed,
+                            "error": message,
+                        }
+                        for mal_id, message in errors.items()
+                    ],
+                )
+                n_failed = sum(message is not None for message in errors.values())
+                await session.execute(
+                    update(AnimeImport)
+                    .where(AnimeImport.id == import_id)
+                    .values(done=AnimeImport.done + len(errors) - n_failed, failed=AnimeImport.failed + n_failed)
+                )
+                await session.commit()
+    except asyncio.CancelledError:
+        logger.warning(f"Import id={import_id} was cancelled")
+        error = "Cancelled on webapp shutdown"
+        raise
+    except Exception as e:
+        logger.exception(f"Import id={import_id} was interrupted")
+        error = repr(e)
+    finally:
+        async with engine.async_session() as session:
+            await session.execute(
+                update(AnimeImport).where(AnimeImport.id == import_id).values(finished_at=func.now(), error=error)
+            )
+            await session.commit()
@@ -0,0 +1,48 @@
+"""
+Loaders of objects together with relationships used by their templates.
+Every relationship level is loaded with one query for all objects,
+so number of queries per page does not depend on number of qitems and sources.
+"""
+
+from typing import *
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+
+from hanyuu.database.main.models import Anime, QItem, QItemSource, QItemSourceTiming
+
+timing_options = (selectinload(QItemSourceTiming.quizparts),)
+source_options = (
+    selectinload(QItemSource.timings).options(*timing_options),
+    joinedload(QItemSource.media),
+    joinedload(QItemSource.preview),
+)
+qitem_options = (
+    selectinload(QItem.sources).options(*source_options),
+    selectinload(QItem.difficulties),
+)
+anime_options = (selectinload(Anime.qitems).options(*qitem_options),)
+
+
+async def load(session: AsyncSession, model_type: Type[Any], options: Iterable[Any], **filters) -> Optional[Any]:
+    # populate_existing, because just created objects are already in session without their relationships
+    return await session.scalar(
+        select(model_type).filter_by(**filters).options(*options).execution_options(populate_existing=True)
+    )
+
+
+async def load_anime(session: AsyncSession, mal_id: int) -> Optional[Anime]:
+    return await load(session, Anime, anime_options, mal_id=mal_id)
+
+
+async def load_qitem(session: AsyncSession, id_: int) -> Optional[QItem]:
+    return await load(session, QItem, qitem_options, id=id_)
+
+
+async def load_source(session: AsyncSession, id_: int) -> Optional[QItemSource]:
+    return await load(session, QItemSource, source_options, id=id_)
+
+
+async def load_timing(session: AsyncSession, id_: int) -> Optional[QItemSourceTiming]:
+    return await load(session, QItemSourceTiming, timing_options, id=id_)
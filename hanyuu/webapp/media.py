@@ -0,0 +1,174 @@
+import asyncio
+import mimetypes
+import os
+from email.utils import formatdate
+from typing import *
+
+import anyio
+from fastapi import HTTPException
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.datastructures import Headers
+from starlette.types import Receive, Scope, Send
+
+from hanyuu.config import getenv
+from hanyuu.video.proxy import ProxyFormat, proxy_args
+
+transcodes = asyncio.Semaphore(getenv("proxy_max_transcodes"))
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(value: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    [start, end) of single byte range. None if range is malformed or has multiple ranges,
+    then whole file is sent (as allowed by RFC 9110).
+    """
+
+    units, _, byte_range = value.partition("=")
+    first, sep, last = byte_range.strip().partition("-")
+    if units.strip() != "bytes" or sep == "" or not (first + last).isdigit():
+        return None
+    if first == "":
+        # last bytes of file
+        if int(last) == 0:
+            raise RangeNotSatisfiable()
+        start, end = max(size - int(last), 0), size
+    else:
+        start, end = int(first), max(size, int(first) + 1) if last == "" else int(last) + 1
+        if end <= start:
+            return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, min(end, size)
+
+
+class MediaResponse(Response):
+    """
+    File response for video players: single byte ranges (206/416), strong ETag from size and mtime
+    with If-None-Match (304) and If-Range, and zero-copy sending when ASGI server supports it.
+    """
+
+    chunk_size = 1 << 20
+
+    def __init__(
+        self,
+        path: str,
+        media_type: Optional[str] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        background: Optional[BackgroundTask] = None,
+    ) -> None:
+        self.path = path
+        self.stat_result = os.stat(path)
+        self.etag = f'"{self.stat_result.st_size:x}-{self.stat_result.st_mtime_ns:x}"'
+        self.last_modified = formatdate(self.stat_result.st_mtime, usegmt=True)
+        super().__init__(
+            headers={
+                "accept-ranges": "bytes",
+                "etag": self.etag,
+                "last-modified": self.last_modified,
+                "cache-control": "no-cache",
+                "content-length": str(self.stat_result.st_size),
+                **(headers or {}),
+            },
+            media_type=media_type or mimetypes.guess_type(path)[0] or "application/octet-stream",
+            background=background,
+        )
+
+    def not_modified(self, if_none_match: Optional[str]) -> bool:
+        if if_none_match is None:
+            return False
+        etags = [etag.strip().removeprefix("W/") for etag in if_none_match.split(",")]
+        return "*" in etags or self.etag in etags
+
+    def range_applies(self, if_range: Optional[str]) -> bool:
+        # range of changed file is ignored, so that players don't mix old and new bytes
+        return if_range is None or if_range in [self.etag, self.last_modified]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        headers = Headers(scope=scope)
+        size = self.stat_result.st_size
+        response_headers = self.headers.mutablecopy()
+        status_code = 200
+        start, end = 0, size
+
+        if self.not_modified(headers.get("if-none-match")):
+            status_code, start, end = 304, 0, 0
+        elif headers.get("range") is not None and self.range_applies(headers.get("if-range")):
+            try:
+                byte_range = parse_range(headers["range"], size)
+            except RangeNotSatisfiable:
+                byte_range = None
+                status_code, start, end = 416, 0, 0
+                response_headers["content-range"] = f"bytes */{size}"
+            if byte_range is not None:
+                status_code, (start, end) = 206, byte_range
+                response_headers["content-range"] = f"bytes {start}-{end - 1}/{size}"
+
+        if status_code == 304:
+            del response_headers["content-type"]
+            del response_headers["content-length"]
+        else:
+            response_headers["content-length"] = str(end - start)
+        await send({"type": "http.response.start", "status": status_code, "headers": response_headers.raw})
+
+        if scope["method"] == "HEAD" or end == start:
+            await send({"type": "http.response.body", "body": b""})
+        elif "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({"type": "http.response.zerocopysend", "file": file, "offset": start, "count": end - start})
+        else:
+            async with await anyio.open_file(self.path, "rb") as file:
+                await file.seek(start)
+                remaining = end - start
+                while remaining > 0:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    # file was truncated while being sent
+                    remaining = remaining - len(chunk) if len(chunk) > 0 else 0
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+
+        if self.background is not None:
+            await self.background()
+
+
+class ProxyResponse(StreamingResponse):
+    """
+    Streaming response that closes its iterator as soon as response ends, also when client disconnects,
+    instead of leaving it to garbage collector.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
+
+
+def proxy_response(path: str, start: float = 0, fmt: Optional[ProxyFormat] = None) -> ProxyResponse:
+    """
+    Low-bitrate transcode of video made on the fly, starting from `start` seconds.
+    It can't be seeked, so players request it again with another start.
+    Number of running transcodes is limited by proxy_max_transcodes, 503 is returned above it.
+    """
+
+    if transcodes.locked():
+        raise HTTPException(status_code=503, detail="Too many proxy transcodes", headers={"retry-after": "5"})
+
+    async def stream() -> AsyncIterator[bytes]:
+        # requests that passed the check at the same time wait for free slot here
+        async with transcodes:
+            process = await asyncio.create_subprocess_exec(
+                *proxy_args(path, start, fmt=fmt), stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+            )
+            try:
+                while chunk := await process.stdout.read(1 << 16):
+                    yield chunk
+            finally:
+                # client disconnected or stream is finished
+                if process.returncode is None:
+                    process.kill()
+                await process.wait()
+
+    return ProxyResponse(stream(), media_type="video/mp4", headers={"cache-control": "no-store"})
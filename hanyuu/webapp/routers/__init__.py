@@ -1 +1 @@
-__all__ = ["animes", "difficulties", "qitems", "sources", "timings"]
+__all__ = ["animes", "difficulties", "qitems", "sources", "stats", "timings"]
@@ -1,118 +1,143 @@
-import asyncio
+from datetime import datetime
 from typing import *
 
-from fastapi import APIRouter, Request
-from fastapi.responses import HTMLResponse, JSONResponse, Response
-from pydantic import BaseModel
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import selectinload
 
-import hanyuu.webparse.anidb as anidb
 import hanyuu.webparse.shiki as shiki
-from hanyuu.database.main.models import Anime, AODAnime
+from hanyuu.database.main.models import Anime, AnimeImport
+from hanyuu.webapp import cache, events, imports, loaders, search
 from hanyuu.webapp.deps import SessionDep
 
 from .utils import already_exists, no_such, templates
 
-router = APIRouter(prefix="/animes")
+router = APIRouter(prefix="/animes", dependencies=[Depends(cache.invalidate_on_write)])
+
+
+# columns used by anime list
+list_columns = (
+    Anime.mal_id,
+    Anime.updated_at,
+    Anime.shiki_title_ro,
+    Anime.shiki_title_ru,
+    Anime.shiki_poster_thumb_url,
+)
 
 
 @router.get("", response_class=HTMLResponse)
-async def read_animes(request: Request, session: SessionDep, page: int = 1) -> Any:
+async def read_animes(
+    request: Request, session: SessionDep, updated_at: Optional[datetime] = None, mal_id: Optional[int] = None
+) -> Any:
+    """
+    Animes from recently updated, page continues after anime with given (updated_at, mal_id).
+    """
+
     page_size = 20
-    result = await session.scalars(
-        select(Anime).order_by(Anime.updated_at.desc()).limit(page_size).offset((page - 1) * page_size)
-    )
-    return templates.TemplateResponse(request=request, name="anime/read_all.html", context={"animes": result.all()})
+
+    async def render() -> Response:
+        statement = select(*list_columns).order_by(Anime.updated_at.desc(), Anime.mal_id.desc()).limit(page_size + 1)
+        if updated_at is not None and mal_id is not None:
+            statement = statement.where(tuple_(Anime.updated_at, Anime.mal_id) < tuple_(updated_at, mal_id))
+        animes = (await session.execute(statement)).all()
+        next_anime = animes[page_size - 1] if len(animes) > page_size else None
+        return templates.TemplateResponse(
+            request=request,
+            name="anime/read_all.html",
+            context={"animes": animes[:page_size], "next_anime": next_anime},
+        )
+
+    return await cache.respond(request, await cache.animes_version(session), render)
 
 
 @router.get("/search", response_class=JSONResponse)
-async def search_animes(session: SessionDep, request: Request, q: str) -> Any:
-    results = await shiki.search(query=q, limit=30)
-    result_ids = [int(item["id"]) for item in results]
-    already_exist = (await session.scalars(select(Anime.mal_id).where(Anime.mal_id.in_(result_ids)))).all()
-    for result in results:
-        result["added"] = int(result["id"]) in already_exist
+async def search_animes(session: SessionDep, request: Request, q: str, remote: bool = False) -> Any:
+    results = await search.search(session, q, limit=30)
+    if remote:
+        # remote search may find animes, which are missing from anime-offline-database
+        local_ids = set(result["id"] for result in results)
+        remote_results = [result for result in await shiki.search(query=q, limit=30) if result["id"] not in local_ids]
+        result_ids = [int(item["id"]) for item in remote_results]
+        already_exist = (await session.scalars(select(Anime.mal_id).where(Anime.mal_id.in_(result_ids)))).all()
+        for result in remote_results:
+            result["added"] = int(result["id"]) in already_exist
+        results += remote_results
     return templates.TemplateResponse(
         request=request,
         name="anime/search.html",
-        context={"animes": results},
+        context={"animes": results, "q": q, "remote": remote},
+    )
+
+
+class AnimeImportSchema(BaseModel):
+    mal_ids: List[int] = Field(min_length=1)
+
+
+def import_accepted(request: Request, anime_import: AnimeImport) -> JSONResponse:
+    imports.start(anime_import.id)
+    status_url = str(request.url_for("read_anime_import", import_id=anime_import.id))
+    return JSONResponse(
+        content={"id": anime_import.id, "status_url": status_url}, status_code=202, headers={"location": status_url}
     )
 
 
-@router.post("", status_code=201)
-async def create_anime(session: SessionDep, mal_id: int) -> Any:
+@router.post("", status_code=202)
+async def create_anime(request: Request, session: SessionDep, mal_id: int) -> Any:
     if await session.get(Anime, mal_id) is not None:
         return already_exists("anime", mal_id=mal_id)
-    shiki_anime = await shiki.get_anime(mal_id)
-    aod_anime = await session.get(AODAnime, mal_id)
-    shiki_anime, aod_anime = await asyncio.gather(shiki.get_anime(mal_id), session.get(AODAnime, mal_id))
-
-    anidb_id = None
-    if aod_anime is None:
-        if shiki_anime.get("anidb_id", None) is None:
-            raise RuntimeError(
-                f"Couldn't parse anidb_id by mal_id={mal_id} (missing from AOD, not in shiki external links)"
-            )
-        else:
-            anidb_id = shiki_anime["anidb_id"]
-    else:
-        anidb_id = aod_anime.anidb_id
-
-    anidb_page = await anidb.Page.from_id(anidb_id)
-    ratings_count = sum([score[1] for score in shiki_anime["scoresStats"]])
-    rating = (
-        sum([score[0] * score[1] for score in shiki_anime["scoresStats"]]) / ratings_count
-        if ratings_count > 0
-        else None
-    )
-    statuses = dict([(status[0], status[1]) for status in shiki_anime["statusesStats"]])
-    result = Anime(
-        mal_id=mal_id,
-        anidb_id=anidb_id,
-        shiki_title_ro=shiki_anime["name"],
-        shiki_title_ru=shiki_anime["russian"],
-        shiki_title_en=shiki_anime["english"],
-        shiki_title_jp=shiki_anime["japanese"],
-        shiki_url=shiki_anime["url"],
-        shiki_status=shiki_anime["status"],
-        shiki_poster_url=shiki_anime["poster"]["originalUrl"],
-        shiki_poster_thumb_url=shiki_anime["poster"]["mainUrl"],
-        shiki_episodes=shiki_anime["episodes"],
-        shiki_duration=shiki_anime["duration"],
-        shiki_rating=rating,
-        shiki_ratings_count=ratings_count,
-        shiki_planned=statuses["planned"],
-        shiki_completed=statuses["completed"],
-        shiki_watching=statuses["watching"],
-        shiki_dropped=statuses["dropped"],
-        shiki_on_hold=statuses["on_hold"],
-        shiki_age_rating=shiki_anime["rating"],
-        shiki_aired_on=shiki_anime["airedOn"],
-        shiki_released_on=shiki_anime["releasedOn"],
-        shiki_videos=[v.values() for v in shiki_anime["videos"]],
-        shiki_synonyms=shiki_anime["synonyms"],
-        shiki_genres=[g["name"] for g in shiki_anime["genres"]],
-        qitems=anidb_page.qitems,
-    )
-    session.add(result)
-    await session.commit()
+    return import_accepted(request, await imports.create(session, [mal_id]))
+
+
+@router.post("/imports", status_code=202)
+async def create_anime_import(request: Request, session: SessionDep, obj: AnimeImportSchema) -> Any:
+    return import_accepted(request, await imports.create(session, obj.mal_ids))
+
+
+@router.get("/imports/{import_id}")
+async def read_anime_import(session: SessionDep, import_id: int) -> Any:
+    anime_import = await session.get(AnimeImport, import_id, options=[selectinload(AnimeImport.items)])
+    if anime_import is None:
+        return no_such("import", id=import_id)
+    return {
+        "id": anime_import.id,
+        "total": anime_import.total,
+        "done": anime_import.done,
+        "failed": anime_import.failed,
+        "finished": anime_import.finished_at is not None,
+        "error": anime_import.error,
+        "items": [
+            {"mal_id": item.mal_id, "status": item.status.name, "error": item.error} for item in anime_import.items
+        ],
+    }
 
 
 @router.get("/{mal_id}", response_class=HTMLResponse)
 async def read_anime(request: Request, session: SessionDep, mal_id: int) -> Any:
-    anime = await session.get(Anime, mal_id)
-    if anime is None:
-        return no_such("anime", id=mal_id)
-    qitems = await anime.awaitable_attrs.qitems
-    for qitem in qitems:
-        sources = await qitem.awaitable_attrs.sources
-        for source in sources:
-            await source.awaitable_attrs.timings
-        await qitem.awaitable_attrs.difficulties
-    return templates.TemplateResponse(
-        request=request,
-        name="anime/read.html",
-        context={"anime": anime},
+    async def render() -> Response:
+        anime = await loaders.load_anime(session, mal_id)
+        if anime is None:
+            return no_such("anime", id=mal_id)
+        return templates.TemplateResponse(
+            request=request,
+            name="anime/read.html",
+            context={"anime": anime},
+        )
+
+    return await cache.respond(request, await cache.anime_version(session, mal_id), render)
+
+
+@router.get("/{mal_id}/events")
+async def read_anime_events(mal_id: int) -> Any:
+    """
+    Server-sent events with changes of sources, timings, difficulties and quiz parts of anime.
+    """
+
+    return StreamingResponse(
+        events.stream(mal_id),
+        media_type="text/event-stream",
+        headers={"cache-control": "no-store", "x-accel-buffering": "no"},
     )
 
 
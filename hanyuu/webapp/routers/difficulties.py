@@ -1,22 +1,30 @@
 from typing import *
 
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Depends, Request
 from fastapi.responses import HTMLResponse
 from pydantic import BaseModel, Field
 
 from hanyuu.database.main.models import QItem, QItemDifficulty
+from hanyuu.webapp import cache
 from hanyuu.webapp.deps import AddedByDep, SessionDep
 
-from .utils import no_such, templates, update_model
+from .utils import bulk_create, bulk_update, no_such, templates, update_model
 
-router = APIRouter(prefix="/difficulties")
+router = APIRouter(prefix="/difficulties", dependencies=[Depends(cache.invalidate_on_write)])
 
 
-class DifficultySchema(BaseModel):
-    id: int
+class DifficultyFields(BaseModel):
     value: int = Field(ge=1, le=100)
 
 
+class DifficultySchema(DifficultyFields):
+    id: int
+
+
+class DifficultyCreateSchema(DifficultyFields):
+    qitem_id: int
+
+
 @router.post("", response_class=HTMLResponse)
 async def create_difficulty(request: Request, added_by: AddedByDep, session: SessionDep, parent_id: int) -> Any:
     qitem = await session.get(QItem, parent_id)
@@ -28,11 +36,29 @@ async def create_difficulty(request: Request, added_by: AddedByDep, session: Ses
     return templates.TemplateResponse(request=request, name="difficulty/edit.html", context={"difficulty": difficulty})
 
 
+@router.get("/{id_}", response_class=HTMLResponse)
+async def read_difficulty(request: Request, session: SessionDep, id_: int) -> Any:
+    difficulty = await session.get(QItemDifficulty, id_)
+    if difficulty is None:
+        return no_such("difficulty", id=id_)
+    return templates.TemplateResponse(request=request, name="difficulty/edit.html", context={"difficulty": difficulty})
+
+
 @router.put("")
 async def update_difficulty(session: SessionDep, added_by: AddedByDep, difficulty: DifficultySchema) -> Any:
     return await update_model(session, added_by, QItemDifficulty, difficulty)
 
 
+@router.post("/bulk")
+async def create_difficulties(request: Request, added_by: AddedByDep, session: SessionDep) -> Any:
+    return await bulk_create(request, session, added_by, QItemDifficulty, DifficultyCreateSchema, "qitem_id", QItem.id)
+
+
+@router.put("/bulk")
+async def update_difficulties(request: Request, added_by: AddedByDep, session: SessionDep) -> Any:
+    return await bulk_update(request, session, added_by, QItemDifficulty, DifficultySchema)
+
+
 @router.delete("/{id_}")
 async def delete_difficulty(session: SessionDep, id_: int) -> Any:
     difficulty = await session.get(QItemDifficulty, id_)
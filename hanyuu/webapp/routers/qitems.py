@@ -1,33 +1,45 @@
 from typing import *
 
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Depends, Request
 from fastapi.responses import HTMLResponse
 from pydantic import BaseModel
+from sqlalchemy import select
 
 from hanyuu.database.main.models import Anime, Category, QItem
+from hanyuu.webapp import cache, loaders
 from hanyuu.webapp.deps import SessionDep
 
-from .utils import no_such, templates, update_model
+from .utils import bulk_create, bulk_update, no_such, templates, update_model
 
-router = APIRouter(prefix="/qitems")
+router = APIRouter(prefix="/qitems", dependencies=[Depends(cache.invalidate_on_write)])
 
 
-class QItemSchema(BaseModel):
-    id: int
+class QItemFields(BaseModel):
     category: Category
     number: int
     song_name: str
     song_artist: str
 
 
+class QItemSchema(QItemFields):
+    id: int
+
+
+class QItemCreateSchema(QItemFields):
+    anime_id: int
+
+
 @router.post("", response_class=HTMLResponse)
 async def create_qitem(request: Request, session: SessionDep, parent_id: int) -> Any:
     anime = await session.get(Anime, parent_id)
     if anime is None:
         return no_such("anime", id=parent_id)
-    qitems = await anime.awaitable_attrs.qitems
     # take minimal excluded opening number for new number
-    numbers = sorted([qitem.number for qitem in qitems if qitem.category == Category.Opening])
+    numbers = sorted(
+        await session.scalars(
+            select(QItem.number).where(QItem.anime_id == parent_id, QItem.category == Category.Opening)
+        )
+    )
     number = 1
     for existing_number in numbers:
         if number == existing_number:
@@ -36,12 +48,8 @@ async def create_qitem(request: Request, session: SessionDep, parent_id: int) ->
             break
     qitem = QItem(anime_id=parent_id, category=Category.Opening, number=number)
     session.add(qitem)
-    session.expire_on_commit = False
     await session.commit()
-    sources = await qitem.awaitable_attrs.sources
-    for source in sources:
-        await source.awaitable_attrs.timings
-    await qitem.awaitable_attrs.difficulties
+    qitem = await loaders.load_qitem(session, qitem.id)
     return templates.TemplateResponse(request=request, name="qitem/edit.html", context={"qitem": qitem})
 
 
@@ -50,6 +58,26 @@ async def update_qitem(session: SessionDep, qitem: QItemSchema) -> Any:
     return await update_model(session, None, QItem, qitem)
 
 
+@router.post("/bulk")
+async def create_qitems(request: Request, session: SessionDep) -> Any:
+    # qitem with the same number is updated, so that songlists can be reimported
+    return await bulk_create(
+        request,
+        session,
+        None,
+        QItem,
+        QItemCreateSchema,
+        "anime_id",
+        Anime.mal_id,
+        conflict_keys=["anime_id", "category", "number"],
+    )
+
+
+@router.put("/bulk")
+async def update_qitems(request: Request, session: SessionDep) -> Any:
+    return await bulk_update(request, session, None, QItem, QItemSchema)
+
+
 @router.delete("/{id_}")
 async def delete_qitem(session: SessionDep, id_: int) -> Any:
     qitem = await session.get(QItem, id_)
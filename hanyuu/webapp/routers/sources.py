@@ -1,28 +1,39 @@
+import os
 from typing import *
 
-from fastapi import APIRouter, Request
-from fastapi.responses import FileResponse, HTMLResponse, Response
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import HTMLResponse, Response
 from pydantic import BaseModel
+from sqlalchemy import delete
 
-from hanyuu.database.main.models import QItem, QItemSource
+from hanyuu.database.main.models import QItem, QItemSource, QItemSourceRetry, SourcePreview
+from hanyuu.webapp import cache, loaders, media
 from hanyuu.webapp.deps import AddedByDep, SessionDep
 
-from .utils import no_such, templates, update_model
+from .utils import bulk_create, bulk_update, no_such, templates, update_model
 
-router = APIRouter(prefix="/sources")
+router = APIRouter(prefix="/sources", dependencies=[Depends(cache.invalidate_on_write)])
 
 
-class SourceSchema(BaseModel):
-    id: int
+class SourceFields(BaseModel):
     platform: str
     path: str
-    additional_path: Optional[str]
+    additional_path: Optional[str] = None
 
     def model_post_init(self, __context):
         if self.additional_path is not None and len(self.additional_path) == 0:
             self.additional_path = None
 
 
+class SourceSchema(SourceFields):
+    id: int
+    additional_path: Optional[str]
+
+
+class SourceCreateSchema(SourceFields):
+    qitem_id: int
+
+
 @router.post("", response_class=HTMLResponse)
 async def create_source(request: Request, added_by: AddedByDep, session: SessionDep, parent_id: int) -> Any:
     qitem = await session.get(QItem, parent_id)
@@ -31,15 +42,47 @@ async def create_source(request: Request, added_by: AddedByDep, session: Session
     source = QItemSource(qitem_id=qitem.id, platform="yt-dlp", path="", added_by=added_by)
     session.add(source)
     await session.commit()
-    await source.awaitable_attrs.timings
+    source = await loaders.load_source(session, source.id)
+    return templates.TemplateResponse(request=request, name="source/edit.html", context={"source": source})
+
+
+@router.get("/{id_}", response_class=HTMLResponse)
+async def read_source(request: Request, session: SessionDep, id_: int) -> Any:
+    source = await loaders.load_source(session, id_)
+    if source is None:
+        return no_such("source", id=id_)
     return templates.TemplateResponse(request=request, name="source/edit.html", context={"source": source})
 
 
 @router.put("")
 async def update_source(session: SessionDep, added_by: AddedByDep, source: SourceSchema) -> Any:
+    # edited source gets fresh download attempts
+    await session.execute(delete(QItemSourceRetry).where(QItemSourceRetry.qitem_source_id == source.id))
     return await update_model(session, added_by, QItemSource, source, additional_kwargs={"invalid": False})
 
 
+@router.post("/bulk")
+async def create_sources(request: Request, added_by: AddedByDep, session: SessionDep) -> Any:
+    return await bulk_create(request, session, added_by, QItemSource, SourceCreateSchema, "qitem_id", QItem.id)
+
+
+@router.put("/bulk")
+async def update_sources(request: Request, added_by: AddedByDep, session: SessionDep) -> Any:
+    async def delete_retries(ids: Set[int]) -> None:
+        # edited sources get fresh download attempts
+        await session.execute(delete(QItemSourceRetry).where(QItemSourceRetry.qitem_source_id.in_(ids)))
+
+    return await bulk_update(
+        request,
+        session,
+        added_by,
+        QItemSource,
+        SourceSchema,
+        additional_kwargs={"invalid": False},
+        on_updated=delete_retries,
+    )
+
+
 @router.delete("/{id_}")
 async def delete_source(session: SessionDep, id_: int) -> Any:
     source = await session.get(QItemSource, id_)
@@ -49,9 +92,77 @@ async def delete_source(session: SessionDep, id_: int) -> Any:
     await session.commit()
 
 
+async def get_local_fp(session: SessionDep, id_: int) -> Union[str, Response]:
+    source = await session.get(QItemSource, id_)
+    if source is None:
+        return no_such("source", id=id_)
+    if source.local_fp is None or not os.path.isfile(source.local_fp):
+        return Response(content=f"QItemSource with id={id_} has not been downloaded yet", status_code=404)
+    return source.local_fp
+
+
 @router.get("/{id_}/downloaded")
+@router.head("/{id_}/downloaded")
 async def get_source_video(session: SessionDep, id_: int) -> Any:
+    local_fp = await get_local_fp(session, id_)
+    if isinstance(local_fp, Response):
+        return local_fp
+    return media.MediaResponse(local_fp)
+
+
+@router.get("/{id_}/proxy")
+async def get_source_proxy(session: SessionDep, id_: int, start: float = Query(default=0, ge=0)) -> Any:
+    local_fp = await get_local_fp(session, id_)
+    if isinstance(local_fp, Response):
+        return local_fp
+    return media.proxy_response(local_fp, start)
+
+
+async def get_preview(session: SessionDep, id_: int) -> Union[SourcePreview, Response]:
     source = await session.get(QItemSource, id_)
-    if source.local_fp is None:
-        return Response(content=f"QItemSource with id={id_} has not been downloaded yet", status_code=404)
-    return FileResponse(source.local_fp)
+    if source is None:
+        return no_such("source", id=id_)
+    preview = await source.awaitable_attrs.preview
+    if preview is None or preview.local_fp != source.local_fp:
+        return Response(content=f"QItemSource with id={id_} has no preview yet", status_code=404)
+    return preview
+
+
+@router.get("/{id_}/preview")
+async def get_source_preview(request: Request, session: SessionDep, id_: int) -> Any:
+    """
+    Urls of preview files and layout of sprite sheet for the timing editor.
+    """
+
+    preview = await get_preview(session, id_)
+    if isinstance(preview, Response):
+        return preview
+    file_url = lambda kind: str(request.url_for("get_source_preview_file", id_=id_, kind=kind))
+    return {
+        "proxy": file_url("proxy"),
+        "peaks": file_url("peaks") if preview.peaks_fp is not None else None,
+        "sprite": (
+            {
+                "url": file_url("sprite"),
+                "interval": preview.sprite_interval,
+                "columns": preview.sprite_columns,
+                "frames": preview.sprite_frames,
+                "tile_width": preview.tile_width,
+                "tile_height": preview.tile_height,
+            }
+            if preview.sprite_fp is not None
+            else None
+        ),
+    }
+
+
+@router.get("/{id_}/preview/{kind}")
+@router.head("/{id_}/preview/{kind}")
+async def get_source_preview_file(session: SessionDep, id_: int, kind: Literal["proxy", "peaks", "sprite"]) -> Any:
+    preview = await get_preview(session, id_)
+    if isinstance(preview, Response):
+        return preview
+    fp = {"proxy": preview.proxy_fp, "peaks": preview.peaks_fp, "sprite": preview.sprite_fp}[kind]
+    if fp is None or not os.path.isfile(fp):
+        return Response(content=f"QItemSource with id={id_} has no preview {kind}", status_code=404)
+    return media.MediaResponse(fp, media_type="application/json" if kind == "peaks" else None)
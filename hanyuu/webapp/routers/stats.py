@@ -0,0 +1,18 @@
+import os
+from typing import *
+
+from fastapi import APIRouter
+
+from hanyuu.database.main.connection import get_engine
+
+router = APIRouter(prefix="/stats")
+
+
+@router.get("/pool")
+async def read_pool_stats() -> Any:
+    """
+    Connection pool of worker that handled the request (each worker has its own).
+    """
+
+    engine = await get_engine(create_tables=False)
+    return {"pid": os.getpid(), **engine.pool_stats()}
@@ -1,20 +1,20 @@
 from datetime import datetime, time
 from typing import *
 
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Depends, Request
 from fastapi.responses import HTMLResponse
 from pydantic import BaseModel, field_validator
 
 from hanyuu.database.main.models import QItemSourceTiming, QItemSource
+from hanyuu.webapp import cache, loaders
 from hanyuu.webapp.deps import AddedByDep, SessionDep
 
-from .utils import no_such, templates, update_model
+from .utils import bulk_create, bulk_update, no_such, templates, update_model
 
-router = APIRouter(prefix="/timings")
+router = APIRouter(prefix="/timings", dependencies=[Depends(cache.invalidate_on_write)])
 
 
-class TimingSchema(BaseModel):
-    id: int
+class TimingFields(BaseModel):
     guess_start: time
     reveal_start: time
 
@@ -46,22 +46,50 @@ class TimingSchema(BaseModel):
         return cls.str_to_time(s)
 
 
+class TimingSchema(TimingFields):
+    id: int
+
+
+class TimingCreateSchema(TimingFields):
+    qitem_source_id: int
+
+
 @router.post("", response_class=HTMLResponse)
 async def create_timing(request: Request, added_by: AddedByDep, session: SessionDep, parent_id: int) -> Any:
     source = await session.get(QItemSource, parent_id)
     if source is None:
         return no_such("source", id=parent_id)
-    timing = QItemSourceTiming(qitem_source_id=parent_id, added_by=added_by)
+    timing = QItemSourceTiming(qitem_source_id=parent_id, added_by=added_by, quizparts=[])
     session.add(timing)
     await session.commit()
     return templates.TemplateResponse(request=request, name="timing/edit.html", context={"timing": timing})
 
 
+@router.get("/{id_}", response_class=HTMLResponse)
+async def read_timing(request: Request, session: SessionDep, id_: int) -> Any:
+    timing = await loaders.load_timing(session, id_)
+    if timing is None:
+        return no_such("timing", id=id_)
+    return templates.TemplateResponse(request=request, name="timing/edit.html", context={"timing": timing})
+
+
 @router.put("")
 async def update_timing(session: SessionDep, added_by: AddedByDep, timing: TimingSchema) -> Any:
     return await update_model(session, added_by, QItemSourceTiming, timing)
 
 
+@router.post("/bulk")
+async def create_timings(request: Request, added_by: AddedByDep, session: SessionDep) -> Any:
+    return await bulk_create(
+        request, session, added_by, QItemSourceTiming, TimingCreateSchema, "qitem_source_id", QItemSource.id
+    )
+
+
+@router.put("/bulk")
+async def update_timings(request: Request, added_by: AddedByDep, session: SessionDep) -> Any:
+    return await bulk_update(request, session, added_by, QItemSourceTiming, TimingSchema)
+
+
 @router.delete("/{id_}")
 async def delete_timing(session: SessionDep, id_: int) -> Any:
     timing = await session.get(QItemSourceTiming, id_)
@@ -1,9 +1,12 @@
 from typing import *
 
-from fastapi import APIRouter
+import orjson
+from fastapi import APIRouter, Request
 from fastapi.responses import RedirectResponse, Response
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import cast, column, select, update, values
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import IntegrityError
 
 from hanyuu.config import getenv
@@ -45,3 +48,183 @@ async def update_model(
         await session.commit()
     except IntegrityError as e:
         return Response(content=e._message(), status_code=400)
+
+
+# rows per statement in bulk endpoints, postgres allows at most 32767 parameters per statement
+bulk_batch_size = 1000
+ndjson_types = ["application/x-ndjson", "application/ndjson", "application/jsonl"]
+
+
+class BulkError(Exception):
+    pass
+
+
+async def read_bulk(request: Request) -> List[Any]:
+    """
+    Items of json array or of ndjson stream (one item per line). Lines, that are not valid json,
+    are returned as BulkError, so that they are reported with other invalid items.
+    """
+
+    def parse_line(line: bytes) -> Any:
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            return BulkError(f"Invalid json: {e}")
+
+    if request.headers.get("content-type", "").split(";")[0].strip() in ndjson_types:
+        items, buffer = [], b""
+        async for chunk in request.stream():
+            *lines, buffer = (buffer + chunk).split(b"\n")
+            items.extend(parse_line(line) for line in lines if line.strip())
+        if buffer.strip():
+            items.append(parse_line(buffer))
+        return items
+    items = orjson.loads(await request.body())
+    if not isinstance(items, list):
+        raise BulkError("Expected json array or ndjson")
+    return items
+
+
+def validate_bulk(items: List[Any], schema: Type[BaseModel]) -> Tuple[List[Dict[str, Any]], Dict[int, BaseModel]]:
+    """
+    Per-item results (errors for invalid items, filled later for valid ones) and valid items by index.
+    """
+
+    results: List[Dict[str, Any]] = [{"ok": False} for _ in items]
+    valid = {}
+    for i, item in enumerate(items):
+        if isinstance(item, BulkError):
+            results[i]["error"] = str(item)
+            continue
+        try:
+            valid[i] = schema.model_validate(item)
+        except ValidationError as e:
+            results[i]["error"] = e.errors(include_url=False, include_context=False)
+    return results, valid
+
+
+def bulk_response(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    n_ok = sum(result["ok"] for result in results)
+    return {"ok": n_ok, "failed": len(results) - n_ok, "results": results}
+
+
+async def bulk_create(
+    request: Request,
+    session: SessionDep,
+    added_by: Optional[AddedByDep],
+    model_type: Type[Base],
+    schema: Type[BaseModel],
+    parent_key: str,
+    parent_column: Any,
+    conflict_keys: Optional[List[str]] = None,
+) -> Any:
+    """
+    Create items of json array or ndjson stream with multi-row inserts in one transaction.
+    Items with missing parent are reported as failed. If conflict_keys are given,
+    existing rows with the same keys are updated instead.
+    """
+
+    try:
+        results, valid = validate_bulk(await read_bulk(request), schema)
+    except (BulkError, orjson.JSONDecodeError) as e:
+        return Response(content=str(e), status_code=400)
+
+    parent_ids = set(getattr(item, parent_key) for item in valid.values())
+    existing_parents = set(await session.scalars(select(parent_column).where(parent_column.in_(parent_ids))))
+    rows = {}
+    # index of item by conflict keys, the same row can't be upserted twice in one statement, last item wins
+    by_key: Dict[Tuple[Any, ...], int] = {}
+    for i, item in valid.items():
+        if getattr(item, parent_key) not in existing_parents:
+            results[i]["error"] = f"{parent_key}={getattr(item, parent_key)} does not exist"
+            continue
+        rows[i] = item.model_dump() | ({"added_by": added_by} if added_by is not None else {})
+        if conflict_keys is not None:
+            key = tuple(rows[i][k] for k in conflict_keys)
+            if key in by_key:
+                results[by_key[key]]["error"] = f"Overridden by item {i}"
+                del rows[by_key[key]]
+            by_key[key] = i
+
+    indexes = list(rows)
+    table = model_type.__table__
+    try:
+        for start in range(0, len(indexes), bulk_batch_size):
+            batch = indexes[start : start + bulk_batch_size]
+            statement = insert(table)
+            if conflict_keys is not None:
+                columns = [k for k in rows[batch[0]] if k not in conflict_keys]
+                statement = statement.on_conflict_do_update(
+                    index_elements=conflict_keys,
+                    set_={k: statement.excluded[k] for k in columns} | {"updated_at": statement.excluded.updated_at},
+                )
+            ids = await session.scalars(
+                statement.returning(table.c.id, sort_by_parameter_order=True), [rows[i] for i in batch]
+            )
+            for i, id_ in zip(batch, ids):
+                results[i] = {"ok": True, "id": id_}
+        await session.commit()
+    except IntegrityError as e:
+        return Response(content=e._message(), status_code=400)
+    return bulk_response(results)
+
+
+async def bulk_update(
+    request: Request,
+    session: SessionDep,
+    added_by: Optional[AddedByDep],
+    model_type: Type[Base],
+    schema: Type[BaseModel],
+    additional_kwargs: Dict[str, Any] = {},
+    on_updated: Optional[Callable[[Set[int]], Awaitable[Any]]] = None,
+) -> Any:
+    """
+    Update items of json array or ndjson stream by id with UPDATE ... FROM (VALUES ...) in one transaction.
+    Items with missing id are reported as failed. on_updated is called with updated ids before commit.
+    """
+
+    try:
+        results, valid = validate_bulk(await read_bulk(request), schema)
+    except (BulkError, orjson.JSONDecodeError) as e:
+        return Response(content=str(e), status_code=400)
+
+    rows = {}
+    # index of item by id, one row is updated once per statement, last item wins
+    by_id: Dict[int, int] = {}
+    for i, item in valid.items():
+        rows[i] = item.model_dump() | additional_kwargs | ({"added_by": added_by} if added_by is not None else {})
+        if rows[i]["id"] in by_id:
+            results[by_id[rows[i]["id"]]]["error"] = f"Overridden by item {i}"
+            del rows[by_id[rows[i]["id"]]]
+        by_id[rows[i]["id"]] = i
+
+    indexes = list(rows)
+    table = model_type.__table__
+    updated_ids = set()
+    try:
+        for start in range(0, len(indexes), bulk_batch_size):
+            batch = indexes[start : start + bulk_batch_size]
+            keys = list(rows[batch[0]])
+            data = values(*[column(k, table.c[k].type) for k in keys], name="data").data(
+                [tuple(rows[i][k] for k in keys) for i in batch]
+            )
+            statement = (
+                update(table)
+                .where(table.c.id == data.c.id)
+                # all-NULL column of VALUES has type text
+                .values({k: cast(data.c[k], table.c[k].type) for k in keys if k != "id"})
+                .returning(table.c.id)
+            )
+            updated_ids.update(await session.scalars(statement))
+        if on_updated is not None:
+            await on_updated(updated_ids)
+        await session.commit()
+    except IntegrityError as e:
+        return Response(content=e._message(), status_code=400)
+
+    for i in indexes:
+        if rows[i]["id"] in updated_ids:
+            results[i] = {"ok": True, "id": rows[i]["id"]}
+        else:
+            results[i]["error"] = f"id={rows[i]['id']} does not exist"
+    return bulk_response(results)
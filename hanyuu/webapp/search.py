@@ -0,0 +1,168 @@
+import asyncio
+import bisect
+import time
+from typing import *
+
+from rapidfuzz import fuzz, process, utils
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from hanyuu.database.main.models import Anime, AODAnime
+
+# how often to check if animes in database changed, in seconds
+check_interval = 30
+# maximum number of candidates from each prefilter
+max_candidates = 500
+
+
+class SearchIndex:
+    """
+    In-process fuzzy index over titles and synonyms of AODAnime and Anime.
+    Results have the same shape as shikimori search results.
+    """
+
+    def __init__(self, animes: Dict[int, Dict[str, Any]], titles: Dict[int, List[str]]) -> None:
+        self.animes = animes
+        self.choices: List[str] = []
+        # mal_id for each choice
+        self.owners: List[int] = []
+        for mal_id, anime_titles in titles.items():
+            for title in dict.fromkeys(map(utils.default_process, filter(None, anime_titles))):
+                if title != "":
+                    self.choices.append(title)
+                    self.owners.append(mal_id)
+
+        # all choices in one string for fast substring search, with offset of each choice
+        self.joined = "\n".join(self.choices)
+        self.offsets = [0]
+        for choice in self.choices[:-1]:
+            self.offsets.append(self.offsets[-1] + len(choice) + 1)
+
+        # choices by words in them, to find titles with misspelled words
+        words: Dict[str, List[int]] = {}
+        for i, choice in enumerate(self.choices):
+            for word in set(choice.split()):
+                words.setdefault(word, []).append(i)
+        self.words = words
+        # words by first character, misspelled first character is rare and searching all words is slow
+        self.vocabulary: Dict[str, List[str]] = {}
+        for word in words:
+            self.vocabulary.setdefault(word[0], []).append(word)
+
+    @classmethod
+    async def build(cls, session: AsyncSession) -> Self:
+        animes, titles = {}, {}
+        for row in await session.execute(
+            select(AODAnime.mal_id, AODAnime.title, AODAnime.synonyms, AODAnime.poster_url)
+        ):
+            animes[row.mal_id] = {
+                "id": str(row.mal_id),
+                "name": row.title,
+                "russian": None,
+                "poster": {"originalUrl": row.poster_url},
+                "url": f"https://shikimori.one/animes/{row.mal_id}",
+                "added": False,
+            }
+            titles[row.mal_id] = [row.title, *row.synonyms]
+        for anime in await session.scalars(select(Anime)):
+            # animes from database have better titles and posters
+            animes[anime.mal_id] = {
+                "id": str(anime.mal_id),
+                "name": anime.shiki_title_ro,
+                "russian": anime.shiki_title_ru,
+                "poster": {"originalUrl": anime.shiki_poster_url},
+                "url": anime.shiki_url,
+                "added": True,
+            }
+            titles[anime.mal_id] = titles.get(anime.mal_id, []) + [
+                anime.shiki_title_ro,
+                anime.shiki_title_ru,
+                anime.shiki_title_en,
+                anime.shiki_title_jp,
+                anime.alias,
+                *anime.shiki_synonyms,
+            ]
+        return await asyncio.to_thread(cls, animes, titles)
+
+    def candidates(self, query: str) -> Set[int]:
+        """
+        Choices, that may match query. Scoring every choice with WRatio is too slow,
+        so candidates are collected with cheap prefilters first.
+        """
+
+        # whole titles with typos
+        matches = process.extract(query, self.choices, scorer=fuzz.QRatio, processor=None, limit=100)
+        candidates = set(i for _, _, i in matches)
+
+        # titles containing query, f.e. beginning of title while typing
+        pos = self.joined.find(query)
+        n_found = 0
+        while pos != -1 and n_found < max_candidates:
+            candidates.add(bisect.bisect_right(self.offsets, pos) - 1)
+            n_found += 1
+            pos = self.joined.find(query, pos + 1)
+
+        # titles containing (misspelled) words of query
+        for word in query.split():
+            if len(word) < 3:
+                continue
+            matches = process.extract(
+                word, self.vocabulary.get(word[0], []), scorer=fuzz.ratio, processor=None, limit=20, score_cutoff=75
+            )
+            for similar_word, _, _ in matches:
+                candidates.update(self.words[similar_word][:max_candidates])
+        return candidates
+
+    def search(self, query: str, limit: int = 30, score_cutoff: float = 60) -> List[Dict[str, Any]]:
+        query = utils.default_process(query)
+        if query == "":
+            return []
+        choices = {i: self.choices[i] for i in self.candidates(query)}
+        # one anime has several titles, so take more matches than needed
+        matches = process.extract(
+            query, choices, scorer=fuzz.WRatio, processor=None, limit=limit * 5, score_cutoff=score_cutoff
+        )
+        scores: Dict[int, float] = {}
+        for _, score, i in matches:
+            mal_id = self.owners[i]
+            scores[mal_id] = max(scores.get(mal_id, 0), score)
+        ranked = sorted(scores, key=lambda mal_id: (-scores[mal_id], not self.animes[mal_id]["added"]))
+        return [self.animes[mal_id] | {"score": scores[mal_id]} for mal_id in ranked[:limit]]
+
+
+index: Optional[SearchIndex] = None
+index_version: Optional[Tuple[Any, ...]] = None
+checked_at = 0.0
+lock = asyncio.Lock()
+
+
+async def data_version(session: AsyncSession) -> Tuple[Any, ...]:
+    row = (
+        await session.execute(
+            select(
+                select(func.count(), func.max(AODAnime.updated_at)).select_from(AODAnime).subquery(),
+                select(func.count(), func.max(Anime.updated_at)).select_from(Anime).subquery(),
+            )
+        )
+    ).one()
+    return tuple(row)
+
+
+async def get_index(session: AsyncSession) -> SearchIndex:
+    """
+    Search index, rebuilt when animes in database changed (f.e. after update_aod).
+    """
+
+    global index, index_version, checked_at
+    async with lock:
+        if index is None or time.monotonic() - checked_at > check_interval:
+            version = await data_version(session)
+            checked_at = time.monotonic()
+            if index is None or version != index_version:
+                index = await SearchIndex.build(session)
+                index_version = version
+    return index
+
+
+async def search(session: AsyncSession, query: str, limit: int = 30) -> List[Dict[str, Any]]:
+    return (await get_index(session)).search(query, limit)
@@ -1 +1,3 @@
-from .page import Page
+from . import snapshots
+from .page import Page, parser_version
+from .tools import get_page
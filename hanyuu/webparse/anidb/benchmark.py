@@ -0,0 +1,87 @@
+"""
+Compare songlist parser with the legacy (per-row PyQuery traversal) one on cached AniDB pages:
+
+    python -m hanyuu.webparse.anidb.benchmark [--limit N]
+"""
+
+import argparse
+import asyncio
+import time
+from typing import *
+
+from pyquery import PyQuery as pq
+from sqlalchemy import select
+
+from hanyuu.database.main.models import Category
+
+from ..utils import default
+from ..zlib_memoize.models import Item
+from .page import Page
+from .tools import get_page
+
+
+@default([])
+def legacy_qitems(page: Page) -> List[Tuple[Category, int, Optional[str], Optional[str]]]:
+    qitems = []
+    counters = {}
+    anidb_ids = set()
+    for song in page.page("table#songlist > tbody td.name.song"):
+        song = pq(song)
+        anidb_id = int(song("a").eq(0).attr("href").split("/")[-1])
+        if anidb_id in anidb_ids:
+            continue
+        category = song.parent().prev_all().children().extend(song.prev_all()).filter(".reltype").eq(-1).text()
+        category = category.strip().lower()
+        if category == "opening":
+            category = Category.Opening
+        elif category == "ending":
+            category = Category.Ending
+        else:
+            break
+        number = counters[category] = counters.get(category, 0) + 1
+        name = song.text().strip()
+        name = name if name != "" else None
+        artist = song.next_all("td.name.creator").text().strip()
+        anidb_ids.add(anidb_id)
+        qitems.append((category, number, name, artist))
+    return qitems
+
+
+def current_qitems(page: Page) -> List[Tuple[Category, int, Optional[str], Optional[str]]]:
+    return [(q.category, q.number, q.song_name, q.song_artist) for q in page.qitems]
+
+
+def measure(parser: Callable[[Page], Any], pages: List[Page]) -> Tuple[float, List[Any]]:
+    started_at = time.perf_counter()
+    results = [parser(page) for page in pages]
+    return time.perf_counter() - started_at, results
+
+
+async def main(limit: int) -> None:
+    memoizer = get_page.memoizer
+    await memoizer.connect()
+    async with memoizer.async_session() as session:
+        keys = (await session.scalars(select(Item.key).where(Item.value.is_not(None)).limit(limit))).all()
+    htmls = [(await memoizer.lookup(key))[1] for key in keys]
+    pages = [Page(html) for html in htmls]
+    print(f"Loaded {len(pages)} cached pages")
+
+    legacy_time, legacy_results = measure(legacy_qitems, pages)
+    current_time, current_results = measure(current_qitems, pages)
+    n_songs = sum(map(len, current_results))
+    mismatches = [key for key, a, b in zip(keys, legacy_results, current_results) if a != b]
+
+    print(f"{n_songs} songs")
+    print(f"legacy:  {legacy_time:.3f}s ({legacy_time / max(len(pages), 1) * 1000:.2f}ms per page)")
+    print(f"current: {current_time:.3f}s ({current_time / max(len(pages), 1) * 1000:.2f}ms per page)")
+    print(f"speedup: {legacy_time / max(current_time, 1e-9):.1f}x")
+    if len(mismatches) > 0:
+        print(f"Results differ for anidb_ids: {mismatches}")
+    await memoizer.engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark songlist parser on cached anidb pages")
+    parser.add_argument("--limit", type=int, default=1000, help="maximum number of pages")
+    args = parser.parse_args()
+    asyncio.run(main(args.limit))
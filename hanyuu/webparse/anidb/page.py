@@ -1,13 +1,23 @@
 import re
+from functools import cached_property
 from typing import *
 
 from pyquery import PyQuery as pq
+from pyquery.text import extract_text
 
 from hanyuu.database.main.models import Category, QItem
 
 from ..utils import default
+from . import snapshots
 from .tools import get_page
 
+# version of data extracted from html, increment on every change in parsing,
+# so that stored snapshots are re-derived
+parser_version = 1
+
+categories = {"opening": Category.Opening, "ending": Category.Ending}
+creator_regexp = re.compile("/creator/([0-9]+)")
+
 
 class Page:
     def __init__(self, html: str) -> None:
@@ -15,56 +25,100 @@ class Page:
 
     @classmethod
     async def from_id(cls, anidb_id: int) -> Self:
-        return cls(await get_page(anidb_id))
+        """
+        Page from stored snapshot if it is up to date, otherwise from (cached) html.
+        """
 
-    @property
+        snapshot = await snapshots.load(anidb_id, parser_version)
+        if snapshot is not None:
+            return cls.from_snapshot(snapshot)
+        html = await get_page(anidb_id)
+        page = cls(html)
+        page.anidb_id = anidb_id
+        if html is not None:
+            await snapshots.save(anidb_id, parser_version, page.snapshot())
+        return page
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Dict[str, Any]) -> Self:
+        page = cls.__new__(cls)
+        # fill cached properties, so that html is never needed
+        page.anidb_id = snapshot["anidb_id"]
+        page.songs = snapshot["songs"]
+        return page
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"anidb_id": self.anidb_id, "songs": self.songs}
+
+    @cached_property
     def anidb_id(self) -> int:
         url = self.page('meta[name="anidb-url"]').eq(0).attr("data-anidb-url")
         return int(re.search("aid=([0-9]+)", url).group(1))
 
-    @property
+    @cached_property
     @default([])
-    def qitems(self) -> List[QItem]:
-        qitems = []
+    def songs(self) -> List[Dict[str, Any]]:
+        """
+        Openings and endings from songlist with their creators.
+
+        Walk songlist cells once in document order, keeping category
+        of the last seen reltype cell.
+        """
+
+        songs = []
         counters = {}
         anidb_ids = set()
-        for song in self.page("table#songlist > tbody td.name.song"):
-            song = pq(song)
-            anidb_id = int(song("a").eq(0).attr("href").split("/")[-1])
-            if anidb_id in anidb_ids:
-                continue
-            category = (
-                song.parent()
-                .prev_all()
-                .children()
-                .extend(song.prev_all())
-                .filter(".reltype")
-                .eq(-1)
-                .text()
-                .strip()
-                .lower()
-            )
-            if category == "opening":
-                category = Category.Opening
-            elif category == "ending":
-                category = Category.Ending
-            else:
-                break
-            number = counters[category] = counters.get(category, 0) + 1
-            name = song.text().strip()
-            name = name if name != "" else None
-            try:
-                artist = song.next_all("td.name.creator").text().strip()
-            except:
-                artist = None
-            anidb_ids.add(anidb_id)
-            qitems.append(
-                QItem(
-                    anime_id=self.anidb_id,
-                    category=category,
-                    number=number,
-                    song_name=name,
-                    song_artist=artist,
-                )
+        for tbody in self.page.root.xpath('//table[@id="songlist"]/tbody'):
+            category = None
+            for row in tbody.iterchildren("tr"):
+                # (song cell, its category, creator cells after it)
+                row_songs = []
+                for cell in row.iterchildren():
+                    classes = cell.get("class", "").split()
+                    if "reltype" in classes:
+                        category = extract_text(cell).strip().lower()
+                    if cell.tag != "td" or "name" not in classes:
+                        continue
+                    if "song" in classes:
+                        row_songs.append((cell, category, []))
+                    elif "creator" in classes:
+                        for _, _, creators in row_songs:
+                            creators.append(cell)
+                for song, song_category, creators in row_songs:
+                    anidb_id = int(song.xpath(".//a")[0].get("href").split("/")[-1])
+                    if anidb_id in anidb_ids:
+                        continue
+                    if song_category not in categories:
+                        return songs
+                    number = counters[song_category] = counters.get(song_category, 0) + 1
+                    name = extract_text(song).strip()
+                    anidb_ids.add(anidb_id)
+                    songs.append(
+                        {
+                            "anidb_id": anidb_id,
+                            "category": song_category,
+                            "number": number,
+                            "name": name if name != "" else None,
+                            "artist": " ".join(map(extract_text, creators)).strip(),
+                            "creators": [
+                                {"anidb_id": int(match.group(1)), "name": extract_text(a).strip()}
+                                for creator in creators
+                                for a in creator.iter("a")
+                                if (match := creator_regexp.search(a.get("href", ""))) is not None
+                            ],
+                        }
+                    )
+        return songs
+
+    @property
+    def qitems(self) -> List[QItem]:
+        return [
+            QItem(
+                anime_id=self.anidb_id,
+                category=categories[song["category"]],
+                number=song["number"],
+                song_name=song["name"],
+                song_artist=song["artist"],
             )
-        return qitems
+            for song in self.songs
+        ]
@@ -0,0 +1,45 @@
+"""
+Re-derive snapshots of cached anidb pages, which are missing or made by older parser version:
+
+    python -m hanyuu.webparse.anidb.rederive [--force]
+"""
+
+import argparse
+import asyncio
+
+from sqlalchemy import String, cast, select
+
+from ..zlib_memoize.models import Item
+from . import snapshots
+from .page import Page, parser_version
+from .snapshots import Snapshot
+from .tools import get_page
+
+
+async def rederive(force: bool) -> None:
+    memoizer = get_page.memoizer
+    async with await snapshots.get_session() as session:
+        statement = select(Item.key).where(Item.value.is_not(None))
+        if not force:
+            up_to_date = select(cast(Snapshot.anidb_id, String)).where(Snapshot.parser_version == parser_version)
+            statement = statement.where(Item.key.not_in(up_to_date))
+        keys = (await session.scalars(statement)).all()
+    print(f"Re-deriving {len(keys)} snapshots (parser_version={parser_version})...")
+
+    for i, key in enumerate(keys, 1):
+        _, html = await memoizer.lookup(key)
+        page = Page(html)
+        page.anidb_id = int(key)
+        await asyncio.to_thread(lambda: page.songs)
+        await snapshots.save(page.anidb_id, parser_version, page.snapshot())
+        if i % 100 == 0 or i == len(keys):
+            print(f"{i}/{len(keys)}")
+    await memoizer.engine.dispose()
+    print("Ok")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="re-derive snapshots of cached anidb pages")
+    parser.add_argument("--force", action="store_true", help="re-derive also up to date snapshots")
+    args = parser.parse_args()
+    asyncio.run(rederive(args.force))
@@ -0,0 +1,67 @@
+"""
+Data extracted from anidb pages, stored as orjson next to cached html (in the same sqlite file),
+so that parsing is done once per parser version. Outdated snapshots are re-derived in bulk
+by `python -m hanyuu.webparse.anidb.rederive`.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import *
+
+import orjson
+from sqlalchemy import LargeBinary, func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncAttrs, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+from .tools import get_page
+
+
+class Base(AsyncAttrs, DeclarativeBase):
+    pass
+
+
+class Snapshot(Base):
+    __tablename__ = "snapshot"
+
+    anidb_id: Mapped[int] = mapped_column(primary_key=True)
+    parser_version: Mapped[int] = mapped_column(index=True)
+    data: Mapped[bytes] = mapped_column(LargeBinary)
+    updated_at: Mapped[datetime] = mapped_column(server_default=func.now(), onupdate=func.now())
+
+
+async_session: Optional[async_sessionmaker[AsyncSession]] = None
+connect_lock = asyncio.Lock()
+
+
+async def get_session() -> AsyncSession:
+    global async_session
+    async with connect_lock:
+        if async_session is None:
+            memoizer = get_page.memoizer
+            await memoizer.connect()
+            async with memoizer.engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            async_session = async_sessionmaker(memoizer.engine, class_=AsyncSession)
+    return async_session()
+
+
+async def load(anidb_id: int, parser_version: int) -> Optional[Dict[str, Any]]:
+    async with await get_session() as session:
+        data = await session.scalar(
+            select(Snapshot.data).where(Snapshot.anidb_id == anidb_id, Snapshot.parser_version == parser_version)
+        )
+    return orjson.loads(data) if data is not None else None
+
+
+async def save(anidb_id: int, parser_version: int, snapshot: Dict[str, Any]) -> None:
+    async with await get_session() as session:
+        statement = insert(Snapshot).values(
+            anidb_id=anidb_id, parser_version=parser_version, data=orjson.dumps(snapshot)
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[Snapshot.anidb_id],
+            set_={"parser_version": statement.excluded.parser_version, "data": statement.excluded.data},
+        )
+        await session.execute(statement)
+        await session.commit()
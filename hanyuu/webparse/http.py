@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import *
+from urllib.parse import urlparse
+
+import aiohttp
+import orjson
+
+from .utils import default_headers
+
+logger = logging.getLogger(__name__)
+
+retry_statuses = {429, 500, 502, 503, 504}
+
+
+@dataclass
+class HostPolicy:
+    # maximum number of simultaneous requests (and pooled connections) to host
+    concurrency: int = 4
+    # requests per second, None for no limit
+    rate: Optional[float] = None
+    burst: int = 1
+    max_retries: int = 3
+    backoff: float = 1.0
+    max_backoff: float = 60.0
+    timeout: float = 60.0
+
+
+default_policy = HostPolicy()
+policies: Dict[str, HostPolicy] = {
+    # 5 requests per second and 90 requests per minute
+    "shikimori.one": HostPolicy(concurrency=5, rate=1.5, burst=5),
+    # anidb bans clients which crawl too fast
+    "anidb.net": HostPolicy(concurrency=1, rate=0.5),
+    "myanimelist.net": HostPolicy(concurrency=2, rate=1),
+    "raw.githubusercontent.com": HostPolicy(timeout=600),
+}
+
+
+class HTTPError(aiohttp.ClientError):
+    def __init__(self, url: str, status: int) -> None:
+        super().__init__(f"{status} for url={url}")
+        self.url = url
+        self.status = status
+
+
+@dataclass
+class Response:
+    url: str
+    status: int
+    headers: Mapping[str, str]
+    body: bytes
+    elapsed: float
+
+    @property
+    def ok(self) -> bool:
+        return self.status < 400
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            raise HTTPError(self.url, self.status)
+
+    def text(self, encoding: str = "utf-8") -> str:
+        return self.body.decode(encoding, errors="replace")
+
+    def json(self) -> Any:
+        return orjson.loads(self.body)
+
+
+@dataclass
+class HostStats:
+    requests: int = 0
+    errors: int = 0
+    retries: int = 0
+    bytes: int = 0
+    total_time: float = 0
+    max_time: float = 0
+
+    @property
+    def mean_time(self) -> float:
+        return self.total_time / self.requests if self.requests > 0 else 0
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.updated_at = time.monotonic()
+                self.tokens = 1
+            self.tokens -= 1
+
+
+class Host:
+    def __init__(self, name: str, policy: HostPolicy) -> None:
+        self.name = name
+        self.policy = policy
+        self.loop = asyncio.get_running_loop()
+        self.semaphore = asyncio.Semaphore(policy.concurrency)
+        self.bucket = TokenBucket(policy.rate, policy.burst) if policy.rate is not None else None
+        self.session = aiohttp.ClientSession(
+            headers=default_headers,
+            connector=aiohttp.TCPConnector(limit=policy.concurrency, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=policy.timeout),
+        )
+        self.stats = HostStats()
+
+    def retry_delay(self, attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.policy.max_backoff)
+            except ValueError:
+                try:
+                    delta = parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)
+                    return min(max(delta.total_seconds(), 0), self.policy.max_backoff)
+                except (TypeError, ValueError):
+                    pass
+        delay = min(self.policy.backoff * 2**attempt, self.policy.max_backoff)
+        return delay * random.uniform(0.8, 1.2)
+
+
+class Client:
+    """
+    HTTP client with pooled session, concurrency limit, rate limit and retry policy per host.
+    """
+
+    def __init__(self) -> None:
+        self.hosts: Dict[str, Host] = {}
+        self.stats: Dict[str, HostStats] = {}
+
+    def host(self, url: str) -> Host:
+        name = urlparse(url).hostname or ""
+        host = self.hosts.get(name, None)
+        # sessions and locks are bound to event loop, so recreate them if it changed
+        if host is None or host.loop is not asyncio.get_running_loop():
+            host = Host(name, policies.get(name, default_policy))
+            host.stats = self.stats.setdefault(name, HostStats())
+            self.hosts[name] = host
+        return host
+
+    async def request(self, method: str, url: str, **kwargs) -> Response:
+        """
+        Make request and read whole response body. Connection errors, timeouts and
+        responses with statuses from retry_statuses are retried with exponential backoff,
+        Retry-After is honoured. Response of the last attempt is returned as is.
+        """
+
+        host = self.host(url)
+        attempt = 0
+        while True:
+            async with host.semaphore:
+                if host.bucket is not None:
+                    await host.bucket.acquire()
+                started_at = time.monotonic()
+                try:
+                    async with host.session.request(method, url, **kwargs) as response:
+                        body = await response.read()
+                        result = Response(str(response.url), response.status, response.headers.copy(), body, 0)
+                    error = None
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    result, error = None, e
+                elapsed = time.monotonic() - started_at
+
+            host.stats.requests += 1
+            host.stats.total_time += elapsed
+            host.stats.max_time = max(host.stats.max_time, elapsed)
+            if result is not None:
+                result.elapsed = elapsed
+                host.stats.bytes += len(result.body)
+                logger.debug(f"{method} {url} -> {result.status} in {elapsed:.2f}s ({len(result.body)} bytes)")
+            else:
+                host.stats.errors += 1
+                logger.debug(f"{method} {url} -> {error!r} in {elapsed:.2f}s")
+
+            retryable = result is None or result.status in retry_statuses
+            if not retryable or attempt >= host.policy.max_retries:
+                if result is None:
+                    raise error
+                return result
+
+            delay = host.retry_delay(attempt, result.headers.get("Retry-After", None) if result else None)
+            reason = f"status {result.status}" if result is not None else repr(error)
+            logger.warning(f"{method} {url} failed ({reason}), retrying in {delay:.1f}s")
+            host.stats.retries += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs) -> AsyncIterator[aiohttp.ClientResponse]:
+        """
+        Make request without reading response body, for large downloads. Body is read
+        by caller from response.content, timeout applies to each read instead of the whole request.
+        There are no retries, as body may be partially consumed.
+        """
+
+        host = self.host(url)
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=host.policy.timeout)
+        async with host.semaphore:
+            if host.bucket is not None:
+                await host.bucket.acquire()
+            started_at = time.monotonic()
+            try:
+                async with host.session.request(method, url, timeout=timeout, **kwargs) as response:
+                    try:
+                        yield response
+                    finally:
+                        host.stats.bytes += response.content.total_bytes
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                host.stats.errors += 1
+                raise
+            finally:
+                elapsed = time.monotonic() - started_at
+                host.stats.requests += 1
+                host.stats.total_time += elapsed
+                host.stats.max_time = max(host.stats.max_time, elapsed)
+                logger.debug(f"{method} {url} streamed in {elapsed:.2f}s")
+
+    async def get(self, url: str, **kwargs) -> Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def close(self) -> None:
+        hosts, self.hosts = self.hosts, {}
+        for host in hosts.values():
+            if host.loop is asyncio.get_running_loop():
+                await host.session.close()
+
+
+client = Client()
+request = client.request
+get = client.get
+post = client.post
+stream = client.stream
+close = client.close
+
+
+def stats() -> Dict[str, HostStats]:
+    return client.stats
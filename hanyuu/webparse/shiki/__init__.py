@@ -1 +1 @@
-from .tools import get_anime, search
+from .tools import anime_columns, get_anime, get_animes, search
@@ -1,10 +1,10 @@
+import asyncio
+from itertools import batched
 from typing import *
 
-import orjson
-from aiohttp import ClientSession
 from urllib.parse import urlparse, parse_qsl
 from pathlib import PurePosixPath
-from ..utils import default_headers
+from .. import http
 
 graphql_url = "https://shikimori.one/api/graphql"
 graphql_args = (
@@ -15,6 +15,15 @@ graphql_args = (
     "videos { kind name url playerUrl }, scoresStats { score count }, "
     "statusesStats { status count }, externalLinks { kind url }"
 )
+# maximum value of limit argument in animes query
+max_batch_size = 50
+
+
+async def query_animes(arguments: str) -> List[Dict[str, Any]]:
+    body = {"operationName": None, "query": f"{{ animes({arguments}) {{ {graphql_args} }} }}", "variables": {}}
+    response = await http.post(graphql_url, json=body)
+    response.raise_for_status()
+    return response.json()["data"]["animes"]
 
 
 def process_anime(anime: Dict[str, Any]) -> Dict[str, Any]:
@@ -60,22 +69,58 @@ def process_anime(anime: Dict[str, Any]) -> Dict[str, Any]:
 
 
 async def get_anime(mal_id: int) -> Optional[Dict[str, Any]]:
-    query = f'{{ animes(ids: "{mal_id}", limit: 1) {{ {graphql_args} }} }}'
-    body = {"operationName": None, "query": query, "variables": {}}
-    async with ClientSession(headers=default_headers) as session:
-        async with session.post(url=graphql_url, json=body) as response:
-            data = orjson.loads(await response.text())
-    animes = data["data"]["animes"]
-    return process_anime(animes[0]) if len(animes) > 0 else None
+    return (await get_animes([mal_id])).get(mal_id, None)
+
+
+async def get_animes(mal_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Fetch animes by mal_ids, packing up to max_batch_size ids in one query.
+    Returns processed animes by mal_id, animes missing on shikimori are omitted.
+    """
+
+    batches = [",".join(map(str, batch)) for batch in batched(dict.fromkeys(mal_ids), max_batch_size)]
+    results = await asyncio.gather(*[query_animes(f'ids: "{ids}", limit: {max_batch_size}') for ids in batches])
+    return {int(anime["id"]): process_anime(anime) for animes in results for anime in animes}
 
 
 async def search(query: str, limit: int = 10) -> List[Dict[str, Any]]:
-    query = f'{{ animes(search: "{query}", limit: {limit}, rating: "!rx") {{ {graphql_args} }} }}'
-    body = {"operationName": None, "query": query, "variables": {}}
-    async with ClientSession(headers=default_headers) as session:
-        async with session.post(url=graphql_url, json=body) as response:
-            data = orjson.loads(await response.text())
-    return list(map(process_anime, data["data"]["animes"]))
+    animes = await query_animes(f'search: "{query}", limit: {limit}, rating: "!rx"')
+    return list(map(process_anime, animes))
+
+
+def anime_columns(anime: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Values of Anime.shiki_* columns from processed anime.
+    """
+
+    ratings_count = sum([score[1] for score in anime["scoresStats"]])
+    rating = sum([score[0] * score[1] for score in anime["scoresStats"]]) / ratings_count if ratings_count > 0 else None
+    statuses = dict([(status[0], status[1]) for status in anime["statusesStats"]])
+    return {
+        "shiki_title_ro": anime["name"],
+        "shiki_title_ru": anime["russian"],
+        "shiki_title_en": anime["english"],
+        "shiki_title_jp": anime["japanese"],
+        "shiki_url": anime["url"],
+        "shiki_status": anime["status"],
+        "shiki_poster_url": anime["poster"]["originalUrl"],
+        "shiki_poster_thumb_url": anime["poster"]["mainUrl"],
+        "shiki_episodes": anime["episodes"],
+        "shiki_duration": anime["duration"],
+        "shiki_rating": rating,
+        "shiki_ratings_count": ratings_count,
+        "shiki_planned": statuses["planned"],
+        "shiki_completed": statuses["completed"],
+        "shiki_watching": statuses["watching"],
+        "shiki_dropped": statuses["dropped"],
+        "shiki_on_hold": statuses["on_hold"],
+        "shiki_age_rating": anime["rating"],
+        "shiki_aired_on": anime["airedOn"],
+        "shiki_released_on": anime["releasedOn"],
+        "shiki_videos": [list(v.values()) for v in anime["videos"]],
+        "shiki_synonyms": anime["synonyms"],
+        "shiki_genres": [g["name"] for g in anime["genres"]],
+    }
 
 
 def get_anidb_id(url: str) -> int:
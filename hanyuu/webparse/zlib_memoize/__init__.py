@@ -0,0 +1,2 @@
+from .codecs import Codec, ZlibCodec, ZstdCodec, train_dictionary
+from .memoizer import Memoizer, zlib_memoize
@@ -0,0 +1,98 @@
+import argparse
+import asyncio
+
+from sqlalchemy import func, or_, select, text, update
+
+from .codecs import train_dictionary
+from .memoizer import Memoizer
+from .models import Dictionary, Item
+
+
+async def main(
+    filename: str, codec: str, train: bool, samples: int, dict_size: int, batch_size: int, vacuum: bool
+) -> None:
+    memoizer = Memoizer(filename, user_function=None, key_creator=str, codec=codec)
+    await memoizer.connect()
+
+    if train:
+        print(f"Training {codec} dictionary on {samples} random pages...", end=" ")
+        async with memoizer.async_session() as session:
+            rows = (
+                await session.execute(
+                    select(Item.value, Item.codec, Item.dictionary_id)
+                    .where(Item.value.is_not(None))
+                    .order_by(func.random())
+                    .limit(samples)
+                )
+            ).all()
+            pages = [(await memoizer.decode(row)).encode(memoizer.encoding) for row in rows]
+            data = train_dictionary(pages, dict_size)
+            session.add(Dictionary(codec=codec, data=data))
+            await session.commit()
+        memoizer.codec = await memoizer.latest_codec(codec)
+        print(f"dictionary_id={memoizer.codec.dictionary_id}, {len(data)} bytes")
+
+    target = memoizer.codec
+    print(f"Recompressing pages with codec={target.name}, dictionary_id={target.dictionary_id}...")
+    n_pages, size_before, size_after, last_id = 0, 0, 0, 0
+    while True:
+        async with memoizer.async_session() as session:
+            rows = (
+                await session.execute(
+                    select(Item.id, Item.value, Item.codec, Item.dictionary_id)
+                    .where(
+                        Item.id > last_id,
+                        Item.value.is_not(None),
+                        or_(Item.codec != target.name, Item.dictionary_id.is_distinct_from(target.dictionary_id)),
+                    )
+                    .order_by(Item.id)
+                    .limit(batch_size)
+                )
+            ).all()
+            if len(rows) == 0:
+                break
+            for row in rows:
+                value = memoizer.encode(await memoizer.decode(row))
+                # keep updated_at, so that recompression does not refresh ttl
+                await session.execute(
+                    update(Item)
+                    .where(Item.id == row.id)
+                    .values(
+                        value=value,
+                        codec=target.name,
+                        dictionary_id=target.dictionary_id,
+                        updated_at=Item.updated_at,
+                    )
+                )
+                n_pages += 1
+                size_before += len(row.value)
+                size_after += len(value)
+            await session.commit()
+            last_id = rows[-1].id
+        print(f"{n_pages} pages: {size_before} -> {size_after} bytes")
+
+    if vacuum:
+        print("Vacuuming...")
+        async with memoizer.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text("VACUUM"))
+
+    await memoizer.engine.dispose()
+    print("Ok")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="recompress page cache with another codec")
+    parser.add_argument("filename", type=str, help="path to .sqlite3 cache file")
+    parser.add_argument("--codec", choices=["zlib", "zstd"], default="zstd")
+    parser.add_argument("--train", action="store_true", help="train new dictionary on cached pages first")
+    parser.add_argument("--samples", type=int, default=2000, help="number of pages to train dictionary on")
+    parser.add_argument("--dict-size", type=int, default=112640, help="dictionary size in bytes")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--no-vacuum", action="store_true", help="do not reclaim freed space in file")
+    args = parser.parse_args()
+    if args.train and args.codec != "zstd":
+        parser.error("only zstd codec supports dictionaries")
+    asyncio.run(
+        main(args.filename, args.codec, args.train, args.samples, args.dict_size, args.batch_size, not args.no_vacuum)
+    )
@@ -0,0 +1,66 @@
+import zlib
+from abc import ABC, abstractmethod
+from typing import *
+
+import zstandard
+
+
+class Codec(ABC):
+    name: str
+    dictionary_id: Optional[int] = None
+
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        pass
+
+    @abstractmethod
+    def decompress(self, data: bytes) -> bytes:
+        pass
+
+
+class ZlibCodec(Codec):
+    name = "zlib"
+
+    def __init__(self, level: int = -1) -> None:
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class ZstdCodec(Codec):
+    name = "zstd"
+
+    def __init__(
+        self, level: int = 19, dictionary: Optional[bytes] = None, dictionary_id: Optional[int] = None
+    ) -> None:
+        self.level = level
+        self.dictionary_id = dictionary_id
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary is not None else None
+        if dict_data is not None:
+            dict_data.precompute_compress(level=level)
+        self.compressor = zstandard.ZstdCompressor(level=level, dict_data=dict_data)
+        self.decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self.decompressor.decompress(data)
+
+
+def train_dictionary(samples: List[bytes], size: int = 112640, level: int = 19) -> bytes:
+    """
+    Train zstd dictionary on uncompressed samples. Needs at least tens of samples to work.
+    """
+
+    return zstandard.train_dictionary(size, samples, level=level).as_bytes()
+
+
+codecs: Dict[str, Type[Codec]] = {
+    "zlib": ZlibCodec,
+    "zstd": ZstdCodec,
+}
@@ -0,0 +1,221 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from typing import *
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from .codecs import Codec, codecs
+from .models import Base, Dictionary, Item, migrate
+
+logger = logging.getLogger(__name__)
+
+
+def utcnow() -> datetime:
+    # sqlite stores CURRENT_TIMESTAMP as naive UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class Memoizer:
+    def __init__(
+        self,
+        filename: str,
+        user_function: Callable[..., Awaitable[Optional[str]]],
+        key_creator: Callable[..., str],
+        encoding: str = "utf-8",
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        eviction: Literal["lru", "lfu"] = "lru",
+        codec: Literal["zlib", "zstd"] = "zlib",
+    ) -> None:
+        self.filename = filename
+        self.user_function = user_function
+        self.key_creator = key_creator
+        self.encoding = encoding
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.eviction = eviction
+        self.codec_name = codec
+
+        self.engine: Optional[AsyncEngine] = None
+        self.async_session: Optional[async_sessionmaker[AsyncSession]] = None
+        self.connect_lock = asyncio.Lock()
+        # codec used for new entries
+        self.codec: Optional[Codec] = None
+        # codecs for decoding by (name, dictionary_id), rows can be compressed by older codecs
+        self.codecs: Dict[Tuple[str, Optional[int]], Codec] = {}
+        # fetches in progress by key, so that concurrent misses wait for the same fetch
+        self.inflight: Dict[str, asyncio.Task] = {}
+
+    async def connect(self) -> None:
+        async with self.connect_lock:
+            if self.engine is not None:
+                return
+            engine = create_async_engine(f"sqlite+aiosqlite:///{self.filename}")
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                await conn.run_sync(migrate)
+            self.async_session = async_sessionmaker(engine, class_=AsyncSession)
+            self.codec = await self.latest_codec(self.codec_name)
+            self.engine = engine
+
+    async def latest_codec(self, name: str) -> Codec:
+        """
+        Codec with the most recently trained dictionary, or without dictionary if there is none.
+        """
+
+        async with self.async_session() as session:
+            dictionary_id = await session.scalar(
+                select(Dictionary.id).where(Dictionary.codec == name).order_by(Dictionary.id.desc()).limit(1)
+            )
+        return await self.get_codec(name, dictionary_id)
+
+    async def get_codec(self, name: str, dictionary_id: Optional[int]) -> Codec:
+        if (name, dictionary_id) not in self.codecs:
+            if dictionary_id is None:
+                codec = codecs[name]()
+            else:
+                async with self.async_session() as session:
+                    dictionary = await session.get_one(Dictionary, dictionary_id)
+                codec = codecs[name](dictionary=dictionary.data, dictionary_id=dictionary_id)
+            self.codecs[(name, dictionary_id)] = codec
+        return self.codecs[(name, dictionary_id)]
+
+    def encode(self, value: Optional[str]) -> Optional[bytes]:
+        return self.codec.compress(value.encode(encoding=self.encoding)) if value is not None else None
+
+    async def decode(self, row: Row) -> Optional[str]:
+        if row.value is None:
+            return None
+        codec = await self.get_codec(row.codec, row.dictionary_id)
+        return codec.decompress(row.value).decode(encoding=self.encoding)
+
+    def is_stale(self, updated_at: datetime) -> bool:
+        return self.ttl is not None and utcnow() - updated_at > timedelta(seconds=self.ttl)
+
+    async def lookup(self, *args, **kwargs) -> Tuple[bool, Optional[str]]:
+        """
+        Get value from cache without calling user function.
+        Returns (True, value) on hit and (False, None) on miss.
+        """
+
+        await self.connect()
+        key = self.key_creator(*args, **kwargs)
+        async with self.async_session() as session:
+            statement = select(Item.value, Item.codec, Item.dictionary_id).where(Item.key == key)
+            row = (await session.execute(statement)).first()
+        return (True, await self.decode(row)) if row is not None else (False, None)
+
+    async def __call__(self, *args, **kwargs) -> Optional[str]:
+        await self.connect()
+        key = self.key_creator(*args, **kwargs)
+        async with self.async_session() as session:
+            row = (
+                await session.execute(
+                    select(Item.id, Item.value, Item.codec, Item.dictionary_id, Item.updated_at).where(Item.key == key)
+                )
+            ).first()
+            if row is not None and self.max_entries is not None:
+                # access statistics are needed only for eviction
+                await session.execute(
+                    update(Item).where(Item.id == row.id).values(accessed_at=func.now(), hits=Item.hits + 1)
+                )
+                await session.commit()
+
+        if row is None:
+            return await asyncio.shield(self.fetch(key, args, kwargs))
+
+        if self.is_stale(row.updated_at):
+            # serve stale value, and refresh it in background
+            self.fetch(key, args, kwargs)
+        return await self.decode(row)
+
+    def fetch(self, key: str, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> asyncio.Task:
+        """
+        Start fetching value by user function, or join already running fetch of the same key.
+        """
+
+        if key not in self.inflight:
+            task = asyncio.create_task(self.fetch_and_store(key, args, kwargs))
+            task.add_done_callback(self.fetch_done(key))
+            self.inflight[key] = task
+        return self.inflight[key]
+
+    def fetch_done(self, key: str) -> Callable[[asyncio.Task], None]:
+        def callback(task: asyncio.Task) -> None:
+            self.inflight.pop(key, None)
+            if not task.cancelled() and task.exception() is not None:
+                logger.warning(f"Fetching of key={key} failed: {task.exception()!r}")
+
+        return callback
+
+    async def fetch_and_store(self, key: str, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Optional[str]:
+        value = await self.user_function(*args, **kwargs)
+        async with self.async_session() as session:
+            statement = insert(Item).values(
+                key=key,
+                value=self.encode(value),
+                codec=self.codec.name,
+                dictionary_id=self.codec.dictionary_id,
+                accessed_at=func.now(),
+            )
+            statement = statement.on_conflict_do_update(
+                index_elements=[Item.key],
+                set_={
+                    "value": statement.excluded.value,
+                    "codec": statement.excluded.codec,
+                    "dictionary_id": statement.excluded.dictionary_id,
+                    "updated_at": func.now(),
+                    "accessed_at": func.now(),
+                },
+                # failed refresh must not overwrite existing value
+                where=Item.value.is_(None) if value is None else None,
+            )
+            await session.execute(statement)
+            if self.max_entries is not None:
+                await self.evict(session)
+            await session.commit()
+        return value
+
+    async def evict(self, session: AsyncSession) -> None:
+        n_excess = await session.scalar(select(func.count(Item.id))) - self.max_entries
+        if n_excess <= 0:
+            return
+        order = [Item.accessed_at] if self.eviction == "lru" else [Item.hits, Item.accessed_at]
+        victims = select(Item.id).order_by(*order).limit(n_excess).scalar_subquery()
+        await session.execute(delete(Item).where(Item.id.in_(victims)))
+
+
+def zlib_memoize(
+    filename: str,
+    key_creator: Callable[..., str],
+    encoding: str = "utf-8",
+    ttl: Optional[float] = None,
+    max_entries: Optional[int] = None,
+    eviction: Literal["lru", "lfu"] = "lru",
+    codec: Literal["zlib", "zstd"] = "zlib",
+) -> Callable:
+    """
+    Cache in sqlite file with compression (zlib, or zstd with trained dictionary).
+
+    Entries older than ttl seconds are served stale and refreshed in background.
+    If max_entries is specified, least recently (lru) or least frequently (lfu) used entries are evicted.
+    Concurrent misses of the same key trigger only one call of wrapped function.
+    Zstd dictionaries are trained, and old entries recompressed, by `python -m hanyuu.webparse.zlib_memoize`.
+    """
+
+    def wrapper(user_function: Callable[..., Awaitable[Optional[str]]]) -> Callable[..., Awaitable[Optional[str]]]:
+        memoizer = Memoizer(filename, user_function, key_creator, encoding, ttl, max_entries, eviction, codec)
+
+        @wraps(user_function)
+        async def wrapped(*args, **kwargs) -> Optional[str]:
+            return await memoizer(*args, **kwargs)
+
+        wrapped.memoizer = memoizer
+        return wrapped
+
+    return wrapper
@@ -0,0 +1,52 @@
+from datetime import datetime
+from typing import *
+
+from sqlalchemy import ForeignKey, LargeBinary, func, text
+from sqlalchemy.ext.asyncio import AsyncAttrs
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+
+class Base(AsyncAttrs, DeclarativeBase):
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(server_default=func.now(), onupdate=func.now())
+
+
+class Dictionary(Base):
+    __tablename__ = "dictionary"
+
+    codec: Mapped[str]
+    data: Mapped[bytes] = mapped_column(LargeBinary)
+
+
+class Item(Base):
+    __tablename__ = "page"
+
+    key: Mapped[str] = mapped_column(nullable=False, unique=True, index=True)
+    value: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+    accessed_at: Mapped[Optional[datetime]] = mapped_column(server_default=func.now())
+    hits: Mapped[int] = mapped_column(default=0, server_default="0")
+    codec: Mapped[str] = mapped_column(server_default="zlib")
+    dictionary_id: Mapped[Optional[int]] = mapped_column(ForeignKey("dictionary.id"), nullable=True)
+
+
+def migrate(connection) -> None:
+    """
+    Bring cache files, created by previous versions, to the current schema:
+    add missing columns, remove duplicated keys and create unique index on key.
+    """
+
+    columns = [row[1] for row in connection.execute(text("PRAGMA table_info(page)"))]
+    if "accessed_at" not in columns:
+        # sqlite can't add column with non-constant default
+        connection.execute(text("ALTER TABLE page ADD COLUMN accessed_at DATETIME"))
+        connection.execute(text("UPDATE page SET accessed_at = updated_at"))
+    if "hits" not in columns:
+        connection.execute(text("ALTER TABLE page ADD COLUMN hits INTEGER NOT NULL DEFAULT 0"))
+    if "codec" not in columns:
+        # all rows before codec column were compressed with zlib
+        connection.execute(text("ALTER TABLE page ADD COLUMN codec VARCHAR NOT NULL DEFAULT 'zlib'"))
+    if "dictionary_id" not in columns:
+        connection.execute(text("ALTER TABLE page ADD COLUMN dictionary_id INTEGER REFERENCES dictionary (id)"))
+    connection.execute(text("DELETE FROM page WHERE id NOT IN (SELECT MAX(id) FROM page GROUP BY key)"))
+    connection.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_page_key ON page (key)"))
@@ -15,5 +15,24 @@ if __name__ == "__main__":
         default=30,
         help="interval time between anidb requests, in seconds",
     )
+    argparser.add_argument(
+        "--prefetch",
+        type=int,
+        default=4,
+        help="number of pages fetched ahead of parsing",
+    )
+    argparser.add_argument(
+        "--idle-interval",
+        type=int,
+        default=60,
+        help="interval time between checks for new animes, when there is nothing to process, in seconds",
+    )
+    argparser.add_argument(
+        "--push",
+        type=int,
+        nargs="*",
+        default=[],
+        help="put animes with these anidb_ids to the head of the queue, and exit",
+    )
     args = argparser.parse_args()
     asyncio.run(start(args))
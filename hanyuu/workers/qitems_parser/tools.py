@@ -1,108 +1,190 @@
 import asyncio
 from argparse import Namespace
+from datetime import timedelta
+from pathlib import Path
 from typing import *
 
-import aiofiles
-from filelock import FileLock
-from sqlalchemy import select
+from sqlalchemy import exists, func, literal, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
 
 import hanyuu.webparse.anidb as anidb
 from hanyuu.config import getenv
 from hanyuu.database.main.connection import get_engine
-from hanyuu.database.main.models import Anime, QItem
-
-
-class ProcessedList:
-    def __init__(self, filename: str) -> None:
-        self.filename = filename
-
-    async def _create_file(self) -> None:
-        async with aiofiles.open(self.filename, "w+"):
-            pass
-
-    async def get(self) -> List[int]:
-        await self._create_file()
-        async with aiofiles.open(self.filename, "r") as f:
-            return [int(t.strip()) for t in await f.readlines()]
-
-    async def is_present(self, anidb_id: int) -> bool:
-        return anidb_id in await self.get()
-
-    async def insert(self, anidb_id: int) -> List[int]:
-        if not await self.is_present(anidb_id):
-            async with aiofiles.open(self.filename, "a+") as f:
-                await f.write(f"{anidb_id}\n")
-
-
-class Queue:
-    def __init__(self, filename: str, lock_filename: str) -> None:
-        self.filename = filename
-        self.lock = FileLock(lock_filename)
-
-    async def _create_queue_file(self) -> None:
-        async with aiofiles.open(self.filename, "w+"):
-            pass
-
-    async def pop(self) -> Optional[int]:
-        with self.lock:
-            await self._create_queue_file()
-            async with aiofiles.open(self.filename, "r") as f:
-                lines = await f.readlines()
-            anime_id = None
-            if len(lines) == 0:
-                return None
-            anime_id = int(lines[0].strip())
-            lines = lines[1:]
-            async with aiofiles.open(self.filename, "w") as f:
-                await f.writelines(lines)
-            return anime_id
-
-    async def push(self, anidb_id: int) -> None:
-        with self.lock:
-            await self._create_queue_file()
-            async with aiofiles.open(self.filename, "a") as f:
-                await f.writelines([f"{anidb_id}\n"])
-
-
-async def process_anime(anime_id: int) -> None:
-    print(f"Processing {anime_id}...", end="")
-    page = await anidb.Page.from_id(anime_id)
+from hanyuu.database.main.models import Anime, QItem, QItemsParserJob
+from hanyuu.webparse.http import TokenBucket
+
+# claimed jobs, which were not processed during that time (f.e. worker crashed), are claimed again
+claim_timeout = timedelta(hours=1)
+
+
+async def push(anidb_ids: List[int], priority: int = 1) -> int:
+    """
+    Put animes to the head of the queue, even if they were already processed.
+    """
+
+    async with engine.async_session() as session:
+        statement = insert(QItemsParserJob).from_select(
+            ["anime_id", "priority"],
+            select(Anime.mal_id, literal(priority)).where(Anime.anidb_id.in_(anidb_ids)),
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[QItemsParserJob.anime_id],
+            set_={"priority": statement.excluded.priority, "claimed_at": None, "processed_at": None},
+        )
+        result = await session.execute(statement)
+        await session.commit()
+    return result.rowcount
+
+
+async def enqueue_missing() -> int:
+    """
+    Add animes without qitems, which were never processed, to the queue.
+    """
+
+    async with engine.async_session() as session:
+        missing = select(Anime.mal_id).where(~exists().where(QItem.anime_id == Anime.mal_id))
+        statement = insert(QItemsParserJob).from_select(["anime_id"], missing).on_conflict_do_nothing()
+        result = await session.execute(statement)
+        await session.commit()
+    return result.rowcount
+
+
+async def claim() -> Optional[Tuple[int, int]]:
+    """
+    Claim the next pending job, returns (mal_id, anidb_id) of its anime.
+    """
+
+    async with engine.async_session() as session:
+        pending = (
+            select(QItemsParserJob.anime_id)
+            .where(
+                QItemsParserJob.processed_at.is_(None),
+                or_(QItemsParserJob.claimed_at.is_(None), QItemsParserJob.claimed_at < func.now() - claim_timeout),
+            )
+            .order_by(QItemsParserJob.priority.desc(), QItemsParserJob.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        mal_id = await session.scalar(
+            update(QItemsParserJob)
+            .where(QItemsParserJob.anime_id == pending)
+            .values(claimed_at=func.now())
+            .returning(QItemsParserJob.anime_id)
+        )
+        await session.commit()
+        if mal_id is None:
+            return None
+        return mal_id, await session.scalar(select(Anime.anidb_id).where(Anime.mal_id == mal_id))
+
+
+async def mark_processed(mal_id: int) -> None:
+    async with engine.async_session() as session:
+        await session.execute(
+            update(QItemsParserJob)
+            .where(QItemsParserJob.anime_id == mal_id)
+            .values(processed_at=func.now(), claimed_at=None)
+        )
+        await session.commit()
+
+
+async def next_anime() -> Optional[Tuple[int, int]]:
+    anime = await claim()
+    if anime is None and await enqueue_missing() > 0:
+        anime = await claim()
+    return anime
+
+
+async def import_legacy_files(worker_dir: str) -> None:
+    """
+    Move processed list and queue from files, used by previous versions, to database.
+    """
+
+    processed_fp = Path(worker_dir) / "processed.txt"
+    if processed_fp.exists():
+        anidb_ids = [int(line) for line in processed_fp.read_text().split()]
+        async with engine.async_session() as session:
+            statement = insert(QItemsParserJob).from_select(
+                ["anime_id", "processed_at"],
+                select(Anime.mal_id, func.now()).where(Anime.anidb_id.in_(anidb_ids)),
+            )
+            await session.execute(statement.on_conflict_do_nothing())
+            await session.commit()
+        processed_fp.rename(processed_fp.with_suffix(".txt.imported"))
+        print(f"Imported {len(anidb_ids)} processed animes from {processed_fp}")
+
+    queue_fp = Path(worker_dir) / "queue.txt"
+    if queue_fp.exists():
+        anidb_ids = [int(line) for line in queue_fp.read_text().split()]
+        await push(anidb_ids)
+        queue_fp.rename(queue_fp.with_suffix(".txt.imported"))
+        print(f"Imported {len(anidb_ids)} queued animes from {queue_fp}")
+
+
+async def prefetch(pages: asyncio.Queue, idle_interval: float) -> None:
+    """
+    Put pages (snapshots or html) of animes to process into queue. Cached pages are taken without waiting,
+    and only real requests to anidb are throttled by the token bucket.
+    """
+
+    while True:
+        anime = await next_anime()
+        if anime is None:
+            print("Nothing to process")
+            await asyncio.sleep(idle_interval)
+            continue
+        mal_id, anidb_id = anime
+        html = None
+        snapshot = await anidb.snapshots.load(anidb_id, anidb.parser_version)
+        if snapshot is None:
+            is_cached, html = await anidb.get_page.memoizer.lookup(anidb_id)
+            if not is_cached:
+                await fetch_bucket.acquire()
+                html = await anidb.get_page(anidb_id)
+        await pages.put((mal_id, anidb_id, snapshot, html))
+
+
+async def process_pages(pages: asyncio.Queue) -> None:
+    while True:
+        await process_anime(*await pages.get())
+
+
+async def process_anime(mal_id: int, anidb_id: int, snapshot: Optional[Dict[str, Any]], html: Optional[str]) -> None:
+    if snapshot is not None:
+        page = anidb.Page.from_snapshot(snapshot)
+    elif html is not None:
+        page = anidb.Page(html)
+        page.anidb_id = anidb_id
+        # parse in thread, so that prefetching goes on meanwhile
+        await asyncio.to_thread(lambda: page.songs)
+        await anidb.snapshots.save(anidb_id, anidb.parser_version, page.snapshot())
+    else:
+        print(f"Processing {anidb_id}... page is unavailable")
+        await mark_processed(mal_id)
+        return
     qitems = page.qitems
     async with engine.async_session() as session:
-        result = await session.scalars(select(QItem).where(QItem.anime_id == anime_id))
+        result = await session.scalars(select(QItem).where(QItem.anime_id == mal_id))
         existing_qitems = [f"{q.category} {q.number}" for q in result.all()]
         qitems = [q for q in qitems if f"{q.category} {q.number}" not in existing_qitems]
+        for qitem in qitems:
+            qitem.anime_id = mal_id
         if len(qitems) > 0:
             session.add_all(qitems)
             await session.commit()
-    await processed_list.insert(anime_id)
-    print(f" fetched {len(qitems)}")
-
-
-async def read_from_db() -> Optional[int]:
-    async with engine.async_session() as session:
-        anime_ids = (await session.scalars(select(Anime.id).outerjoin(Anime.qitems).where(QItem.id.is_(None)))).all()
-    processed = await processed_list.get()
-    for anime_id in anime_ids:
-        if anime_id not in processed:
-            return anime_id
-    return None
+    await mark_processed(mal_id)
+    print(f"Processing {anidb_id}... fetched {len(qitems)}")
 
 
 async def start(args: Namespace) -> None:
-    global worker_dir, engine, processed_list
+    global engine, fetch_bucket
 
     engine = await get_engine()
-    worker_dir = f"{getenv("resources_dir")}/workers/qitems_parser"
-    processed_list = ProcessedList(f"{worker_dir}/processed.txt")
-    queue = Queue(f"{worker_dir}/queue.txt", f"{worker_dir}/queue.lock")
-
-    while True:
-        anime_id = await queue.pop() or await read_from_db()
-
-        if anime_id is not None:
-            await process_anime(anime_id)
-        else:
-            print("Nothing to process")
-
-        await asyncio.sleep(args.interval)
+    await import_legacy_files(f"{getenv("resources_dir")}/workers/qitems_parser")
+    if len(args.push) > 0:
+        print(f"Pushed {await push(args.push)} animes to queue")
+        return
+
+    fetch_bucket = TokenBucket(rate=1 / args.interval, burst=1)
+    pages = asyncio.Queue(maxsize=args.prefetch)
+    await asyncio.gather(prefetch(pages, args.idle_interval), process_pages(pages))
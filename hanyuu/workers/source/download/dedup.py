@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import logging
+import re
+from datetime import timedelta
+from pathlib import Path, PurePosixPath
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+import aiohttp
+from sqlalchemy import func, select, update
+
+from hanyuu.config import getenv
+from hanyuu.database.main.connection import get_engine
+from hanyuu.database.main.models import QItemSource, SourceFile
+
+from .strategies.torrent import TorrentPath
+
+logger = logging.getLogger(__name__)
+
+youtube_hosts = ["youtube.com", "youtube-nocookie.com", "youtu.be"]
+youtube_id_regex = re.compile("^[A-Za-z0-9_-]{11}$")
+tracking_params = ["si", "feature", "pp", "t", "utm_source", "utm_medium", "utm_campaign"]
+
+
+def youtube_id(url: str) -> Optional[str]:
+    parsed = urlparse(url if "//" in url else f"https://{url}")
+    host = (parsed.hostname or "").lower()
+    if not any(host == h or host.endswith("." + h) for h in youtube_hosts):
+        return None
+
+    parts = PurePosixPath(parsed.path).parts
+    if host.endswith("youtu.be"):
+        candidate = parts[1] if len(parts) > 1 else None
+    elif len(parts) > 2 and parts[1] in ["embed", "shorts", "v", "live"]:
+        candidate = parts[2]
+    else:
+        candidate = dict(parse_qsl(parsed.query)).get("v")
+
+    if candidate is not None and youtube_id_regex.match(candidate) is not None:
+        return candidate
+    return None
+
+
+def canonical_url(url: str) -> str:
+    parsed = urlparse(url.strip())
+    query = [(k, v) for k, v in parse_qsl(parsed.query) if k not in tracking_params]
+    return urlunparse(
+        parsed._replace(
+            scheme=parsed.scheme.lower(),
+            netloc=parsed.netloc.lower().removeprefix("www."),
+            query=urlencode(sorted(query)),
+            fragment="",
+        )
+    )
+
+
+async def canonical_path(source: QItemSource) -> Optional[str]:
+    """
+    Canonical form of source location, same for sources that point to the same video.
+    Returns None if it can't be determined.
+    """
+
+    if source.path is None:
+        return None
+
+    if source.platform == "yt-dlp":
+        video_id = youtube_id(source.path)
+        if video_id is not None:
+            return f"youtube:{video_id}"
+        return f"url:{canonical_url(source.path)}"
+
+    if source.platform == "torrent":
+        torrent_path = TorrentPath(source.path)
+        if source.additional_path is None or not torrent_path.is_valid():
+            return None
+        try:
+            infohash = await torrent_path.infohash()
+        except (aiohttp.ClientError, ValueError, KeyError, OSError):
+            return None
+        return f"btih:{infohash}/{PurePosixPath(source.additional_path.replace("\\", "/").strip("/"))}"
+
+    if source.platform == "local":
+        return f"file:{Path(source.path).resolve()}"
+
+    return None
+
+
+async def reuse_download(source: QItemSource) -> bool:
+    """
+    Set canonical path of source, and reuse file of other source with the same canonical path.
+
+    Returns True if source shouldn't be downloaded: either file was reused,
+    or other source with the same canonical path is being downloaded right now.
+    Downloading flag of twin that wasn't updated for download_twin_timeout is ignored,
+    as its worker may have crashed without resetting it.
+    """
+
+    path = await canonical_path(source)
+    engine = await get_engine()
+    async with engine.async_session() as session:
+        session.add(source)
+        source.canonical_path = path
+        await session.commit()
+        if path is None:
+            return False
+
+        timeout = timedelta(seconds=getenv("download_twin_timeout"))
+        twins = (
+            await session.scalars(
+                select(QItemSource)
+                .where(QItemSource.canonical_path == path)
+                .where(QItemSource.id != source.id)
+                .where(
+                    QItemSource.local_fp.isnot(None)
+                    | (QItemSource.downloading.is_(True) & (QItemSource.updated_at > func.now() - timeout))
+                )
+                .order_by(QItemSource.local_fp.is_(None))
+            )
+        ).all()
+        if len(twins) == 0:
+            return False
+
+        twin = twins[0]
+        if twin.local_fp is None:
+            logger.info(f"Source with the same path is being downloaded: source_id={twin.id}, path={path}")
+            return True
+
+        source.local_fp = twin.local_fp
+        source.mezzanine_fp = twin.mezzanine_fp
+        await session.commit()
+    logger.info(f"Reused file of source_id={twin.id} for source_id={source.id}: {source.local_fp}")
+    return True
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def is_owned(platform: str, local_fp: str) -> bool:
+    """
+    Is file downloaded by us (and not by qbt or user), so we can delete it.
+    """
+
+    sources_dir = (Path(getenv("resources_dir")) / "videos" / "sources").resolve()
+    return platform != "torrent" and Path(local_fp).resolve().is_relative_to(sources_dir)
+
+
+async def register_file(qitem_source_id: int) -> None:
+    """
+    Register downloaded file of source by its content hash. If the same file
+    was already downloaded, source will reference it, and the new copy is removed.
+    """
+
+    engine = await get_engine()
+    async with engine.async_session() as session:
+        source = await session.get(QItemSource, qitem_source_id)
+        if source is None or source.local_fp is None or not Path(source.local_fp).is_file():
+            return
+
+        sha256 = await asyncio.to_thread(file_sha256, source.local_fp)
+        existing = await session.scalar(select(SourceFile).where(SourceFile.sha256 == sha256))
+        if existing is not None and existing.local_fp == source.local_fp:
+            return
+
+        if existing is not None and Path(existing.local_fp).is_file():
+            # point every reference of duplicate to the registered file
+            duplicate_fp = source.local_fp
+            await session.execute(
+                update(QItemSource).where(QItemSource.local_fp == duplicate_fp).values(local_fp=existing.local_fp)
+            )
+            await session.commit()
+            logger.info(f"Source_id={source.id} is a duplicate of {existing.local_fp}")
+            if Path(duplicate_fp).resolve() != Path(existing.local_fp).resolve() and is_owned(
+                source.platform, duplicate_fp
+            ):
+                logger.info(f"Removing duplicate file {duplicate_fp}")
+                Path(duplicate_fp).unlink(missing_ok=True)
+            return
+
+        if existing is not None:
+            # file of previous registration was removed
+            await session.delete(existing)
+            await session.flush()
+        session.add(SourceFile(sha256=sha256, local_fp=source.local_fp, size=Path(source.local_fp).stat().st_size))
+        await session.commit()
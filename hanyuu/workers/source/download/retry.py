@@ -0,0 +1,80 @@
+import logging
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import delete
+
+from hanyuu.database.main.connection import get_engine
+from hanyuu.database.main.models import FailureClass, QItemSource, QItemSourceRetry
+
+logger = logging.getLogger(__name__)
+
+hour = 60 * 60
+day = 24 * hour
+
+
+@dataclass
+class RetryPolicy:
+    base: float  # delay after first failure, in seconds
+    max_delay: float  # delay limit, in seconds
+    max_attempts: Optional[int] = None  # source is marked as invalid after this number of failures
+    factor: float = 2  # delay multiplier for each next failure
+    jitter: float = 0.2  # relative random deviation of delay
+
+    def delay(self, attempts: int) -> float:
+        delay = min(self.max_delay, self.base * self.factor ** max(0, attempts - 1))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+policies: Dict[FailureClass, RetryPolicy] = {
+    FailureClass.Network: RetryPolicy(base=60, max_delay=hour, max_attempts=30),
+    FailureClass.AgeRestricted: RetryPolicy(base=6 * hour, max_delay=7 * day, max_attempts=5),
+    FailureClass.Cookies: RetryPolicy(base=10 * 60, max_delay=day, max_attempts=10),
+    FailureClass.TorrentClient: RetryPolicy(base=2 * 60, max_delay=hour, max_attempts=30),
+    FailureClass.Metadata: RetryPolicy(base=hour, max_delay=day, max_attempts=5),
+    FailureClass.Unknown: RetryPolicy(base=5 * 60, max_delay=day, max_attempts=8),
+}
+
+
+async def schedule_retry(qitem_source_id: int, failure_class: FailureClass, message: str) -> Optional[datetime]:
+    """
+    Register failed download attempt of source, and schedule next one by policy of failure class.
+
+    Returns time of next attempt, or None if attempts limit is reached and source was marked as invalid.
+    """
+
+    policy = policies[failure_class]
+    engine = await get_engine()
+    async with engine.async_session() as session:
+        retry = await session.get(QItemSourceRetry, qitem_source_id)
+        if retry is None:
+            retry = QItemSourceRetry(qitem_source_id=qitem_source_id, attempts=0)
+            session.add(retry)
+
+        retry.attempts += 1
+        retry.failure_class = failure_class
+        retry.last_error = message
+        retry.next_attempt_at = datetime.now(timezone.utc) + timedelta(seconds=policy.delay(retry.attempts))
+
+        if policy.max_attempts is not None and retry.attempts >= policy.max_attempts:
+            source = await session.get(QItemSource, qitem_source_id)
+            source.invalid = True
+            source.downloading = False
+            await session.commit()
+            logger.warning(
+                f"Source marked as invalid after {retry.attempts} failed attempts "
+                f"(source_id={qitem_source_id}, last failure: {failure_class.name})"
+            )
+            return None
+
+        await session.commit()
+        return retry.next_attempt_at
+
+
+async def clear_retry(qitem_source_id: int) -> None:
+    engine = await get_engine()
+    async with engine.async_session() as session:
+        await session.execute(delete(QItemSourceRetry).where(QItemSourceRetry.qitem_source_id == qitem_source_id))
+        await session.commit()
@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 
-from hanyuu.database.main.models import QItemSource
+from hanyuu.database.main.models import FailureClass, QItemSource
 
 
 class SourceDownloadStrategy(ABC):
@@ -29,4 +29,6 @@ class InvalidSource(Exception):
 
 
 class TemporaryFailure(Exception):
-    pass
+    def __init__(self, message: str, failure_class: FailureClass = FailureClass.Unknown) -> None:
+        super().__init__(message)
+        self.failure_class = failure_class
@@ -1,8 +1,11 @@
 from pathlib import Path
+
 import ffmpeg
+from sqlalchemy import delete
 
 from hanyuu.database.main.connection import get_engine
-from hanyuu.database.main.models import QItemSource
+from hanyuu.database.main.models import QItemSource, SourceMedia
+from hanyuu.video.probe import has_video_and_audio, probe
 from hanyuu.workers.utils import try_make_path_relative
 
 from .base import InvalidSource, SourceDownloadStrategy
@@ -14,21 +17,18 @@ class LocalFileStrategy(SourceDownloadStrategy):
             raise InvalidSource("Path can't be NULL")
         if not Path(qitem_source.path).exists():
             raise InvalidSource(f'File "{qitem_source.path}" does not exist')
-        if not is_video_with_audio(qitem_source.path):
+        try:
+            media = probe(qitem_source.path)
+        except ffmpeg.Error:
+            raise InvalidSource(f'File "{qitem_source.path}" is not a media file')
+        if not has_video_and_audio(media):
             raise InvalidSource(f'File "{qitem_source.path}" is not a video or video without audio')
 
         engine = await get_engine()
         async with engine.async_session() as session:
             session.add(qitem_source)
             qitem_source.local_fp = str(try_make_path_relative(qitem_source.path))
+            # keep probe result, so that probing worker doesn't need to probe it again
+            await session.execute(delete(SourceMedia).where(SourceMedia.qitem_source_id == qitem_source.id))
+            session.add(SourceMedia(qitem_source_id=qitem_source.id, local_fp=qitem_source.local_fp, **media))
             await session.commit()
-
-
-def is_video_with_audio(path: str) -> bool:
-    try:
-        probe_result = ffmpeg.probe(path, show_entries="stream=codec_type")
-        next(filter(lambda s: s["codec_type"] == "video", probe_result["streams"]))
-        next(filter(lambda s: s["codec_type"] == "audio", probe_result["streams"]))
-        return True
-    except (KeyError, StopIteration, ffmpeg.Error):
-        return False
@@ -1,3 +1,5 @@
+import base64
+import binascii
 import datetime
 import hashlib
 import logging
@@ -5,17 +7,17 @@ import re
 from enum import Enum, auto
 from pathlib import Path
 from typing import Optional, Tuple
-from urllib.parse import urlparse
+from urllib.parse import parse_qsl, urlparse
 
 import aiofiles
 import aiohttp
 import bencodepy
 import qbittorrentapi as qbt
 
+import hanyuu.webparse.http as http
 from hanyuu.config import getenv
 from hanyuu.database.main.connection import get_engine
-from hanyuu.database.main.models import QItemSource
-from hanyuu.webparse.utils import default_headers
+from hanyuu.database.main.models import FailureClass, QItemSource
 from hanyuu.workers.utils import FiledList
 
 from .base import SourceDownloadStrategy, InvalidSource, TemporaryFailure
@@ -45,66 +47,71 @@ class TorrentDownloadingStrategy(SourceDownloadStrategy):
             try:
                 infohash = await torrent_path.infohash()
             except aiohttp.ClientError:
-                raise TemporaryFailure(f"Failed to download torrent by url={qitem_source.path}")
+                raise TemporaryFailure(f"Failed to download torrent by url={qitem_source.path}", FailureClass.Network)
             except (ValueError, KeyError):
                 raise InvalidSource("Failed to bdecode torrent file contents")
 
             # search for that torrent in qbt
             torrent = next(iter(self.qbt_client.torrents_info(torrent_hashes=infohash)), None)
-            if torrent is None:
+            is_new = torrent is None
+            if is_new:
                 try:
                     # if torrent was not added before, add it
+                    add_kwargs = {"is_paused": True}
+                    if torrent_path.path_type == PathType.MAGNET:
+                        # paused magnets never fetch metadata, so let qbt stop the torrent by itself,
+                        # right after metadata is received (before any file is downloaded)
+                        add_kwargs = {"stop_condition": "MetadataReceived"}
                     self.qbt_client.torrents_add(
                         urls=torrent_path.path,
-                        save_path=str((Path(getenv("resources_dir") / "videos" / "sources" / self.name)).resolve()),
+                        save_path=str((Path(getenv("resources_dir")) / "videos" / "sources" / self.name).resolve()),
                         tags=f"hanyuu_{self.name}",
                         category="hanyuu",
-                        is_paused=True,
+                        **add_kwargs,
                     )
                 except (qbt.UnsupportedMediaType415Error, qbt.FileNotFoundError, qbt.TorrentFilePermissionError) as e:
-                    exc_type = TemporaryFailure if isinstance(e, qbt.TorrentFilePermissionError) else InvalidSource
-                    raise exc_type(f"qBitTorrent failed to add torrent by url={torrent_path.path} with exception: {e}")
+                    message = f"qBitTorrent failed to add torrent by url={torrent_path.path} with exception: {e}"
+                    if isinstance(e, qbt.TorrentFilePermissionError):
+                        raise TemporaryFailure(message, FailureClass.TorrentClient)
+                    raise InvalidSource(message)
 
                 # get new torrent info
                 torrent = next(iter(self.qbt_client.torrents_info(torrent_hashes=infohash)), None)
-                if torrent is None:
+                if torrent is None and torrent_path.path_type != PathType.MAGNET:
                     raise InvalidSource(f'Couldn\'t add new torrent with url="{torrent_path.path}"')
 
-                # set "don't download" for all files
-                files = self.qbt_client.torrents_files(infohash)
-                ids = [f["id"] for f in files]
-                self.qbt_client.torrents_file_priority(infohash, ids, priority=0)
+            if torrent_path.path_type == PathType.MAGNET and not has_metadata(self.qbt_client, infohash):
+                # file can't be selected without metadata, so torrent checker will do it later
+                logger.info(f"Waiting for metadata of magnet link: {torrent_path.path}")
+                file_path, state = qitem_source.additional_path, TorrentState.METADATA
             else:
-                files = self.qbt_client.torrents_files(infohash)
-
-            # find file we need in torrent contents
-            file_id, file_path = await self.find_file(files, qitem_source.additional_path)
-            if file_id is None:
-                raise InvalidSource(f'"{qitem_source.additional_path}" was not found in torrent {torrent_path.path}')
-
-            # set high priority for file we need
-            self.qbt_client.torrents_file_priority(infohash, file_id, 6)
-
-            # resume torrent, in case it's paused after we added it
-            self.qbt_client.torrents_resume(infohash)
+                # find file we need in torrent contents, and download only it
+                file_path = select_file(self.qbt_client, infohash, qitem_source.additional_path, is_new)
+                if file_path is None:
+                    raise InvalidSource(
+                        f'"{qitem_source.additional_path}" was not found in torrent {torrent_path.path}'
+                    )
+                state = TorrentState.DOWNLOADING
 
             # add torrent into list of downloading torrents
+            dtf = {
+                "infohash": infohash,
+                "name": file_path,
+                "state": state.value,
+                "qitem_source_id": qitem_source.id,
+                "added_on": datetime.datetime.now(),
+            }
+            if state == TorrentState.METADATA:
+                dtf["exclusive"] = is_new
             async with FiledList(str(worker_dir / "downloading_torrents.json")) as dtfs:
-                dtfs.append(
-                    {
-                        "infohash": infohash,
-                        "name": file_path,
-                        "qitem_source_id": qitem_source.id,
-                        "added_on": datetime.datetime.now(),
-                    }
-                )
+                dtfs.append(dtf)
         except Exception as e:
             async with engine.async_session() as session:
                 session.add(qitem_source)
                 qitem_source.downloading = False
                 await session.commit()
             if isinstance(e, (qbt.NotFound404Error, qbt.Conflict409Error)):
-                raise TemporaryFailure(f"Exception from qBitTorrent occured: {e}")
+                raise TemporaryFailure(f"Exception from qBitTorrent occured: {e}", FailureClass.TorrentClient)
             # this should not happen, but if any other exceptions occured, it's an error
             raise e
 
@@ -122,18 +129,56 @@ class TorrentDownloadingStrategy(SourceDownloadStrategy):
             try:
                 self._qbt_client.auth_log_in()
             except qbt.APIConnectionError as e:
-                raise TemporaryFailure(f"Failed to auth to qBitTorrent: {e}")
+                raise TemporaryFailure(f"Failed to auth to qBitTorrent: {e}", FailureClass.TorrentClient)
         return self._qbt_client
 
-    async def find_file(self, files: qbt.TorrentFilesList, name: str) -> Tuple[Optional[int], Optional[str]]:
-        target = Path(name)
-        for file in files:
-            # with root folder or without
-            with_root = Path(file["name"])
-            without_root = Path("/".join(with_root.parts[1:]))
-            if with_root == target or without_root == target:
-                return file["id"], file["name"]
-        return None, None
+
+class TorrentState(Enum):
+    METADATA = "metadata"  # waiting for metadata of magnet link
+    DOWNLOADING = "downloading"
+
+
+def has_metadata(client: qbt.Client, infohash: str) -> bool:
+    try:
+        return len(client.torrents_files(infohash)) > 0
+    except qbt.NotFound404Error:
+        return False
+
+
+def find_file(files: qbt.TorrentFilesList, name: str) -> Tuple[Optional[int], Optional[str]]:
+    target = Path(name)
+    for file in files:
+        # with root folder or without
+        with_root = Path(file["name"])
+        without_root = Path("/".join(with_root.parts[1:]))
+        if with_root == target or without_root == target:
+            return file["id"], file["name"]
+    return None, None
+
+
+def select_file(client: qbt.Client, infohash: str, name: str, exclusive: bool) -> Optional[str]:
+    """
+    Set high priority for file with given name in torrent, and resume torrent.
+    If exclusive is True, all other files are set to "don't download".
+
+    Returns path of file inside torrent, or None if there's no such file.
+    """
+
+    files = client.torrents_files(infohash)
+    file_id, file_path = find_file(files, name)
+    if file_id is None:
+        return None
+
+    if exclusive:
+        # set "don't download" for all files
+        client.torrents_file_priority(infohash, [f["id"] for f in files], priority=0)
+
+    # set high priority for file we need
+    client.torrents_file_priority(infohash, file_id, 6)
+
+    # resume torrent, in case it's paused after we added it
+    client.torrents_resume(infohash)
+    return file_path
 
 
 class PathType(Enum):
@@ -168,6 +213,7 @@ def get_path_type(path: str) -> Optional[PathType]:
 
 forbidden_path_characters_regex = re.compile("[" + re.escape('<>":|?*') + "]")
 windows_disk_regex = re.compile("^[A-Za-z]:.*$")
+hex_regex = re.compile("^[0-9A-Fa-f]+$")
 
 
 class TorrentPath:
@@ -177,21 +223,45 @@ class TorrentPath:
 
     def is_valid(self) -> bool:
         if self.path_type == PathType.MAGNET:
-            logger.warning("Magnet links are not supported yet (don't know how to retrieve info hash)")
-            return False
+            return magnet_infohash(self.path) is not None
         return self.path_type is not None
 
     async def infohash(self) -> str:
         if not hasattr(self, "_infohash"):
             if self.path_type == PathType.URL:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(self.path, headers=default_headers) as response:
-                        data = await response.content.read()
+                response = await http.get(self.path)
+                response.raise_for_status()
+                data = response.body
             elif self.path_type == PathType.LOCAL:
                 async with aiofiles.open(self.path, "rb") as f:
                     data = await f.read()
+            elif self.path_type == PathType.MAGNET:
+                self._infohash = magnet_infohash(self.path)
+                if self._infohash is None:
+                    raise ValueError(f"Magnet link has no valid btih: {self.path}")
+                return self._infohash
             else:
                 raise ValueError(f"Invalid torrent path (recognized type = {self.path_type})")
 
             self._infohash = hashlib.sha1(bencodepy.encode(bencodepy.decode(data)[b"info"])).hexdigest()
         return self._infohash
+
+
+def magnet_infohash(path: str) -> Optional[str]:
+    """
+    Parse v1 infohash (as lowercase hex) from "xt=urn:btih:..." parameter of magnet link.
+    Both hex (40 chars) and base32 (32 chars) encodings are supported.
+    """
+
+    for key, value in parse_qsl(urlparse(path).query):
+        if key != "xt" or not value.lower().startswith("urn:btih:"):
+            continue
+        btih = value[len("urn:btih:") :]
+        if len(btih) == 40 and hex_regex.match(btih) is not None:
+            return btih.lower()
+        if len(btih) == 32:
+            try:
+                return base64.b32decode(btih.upper()).hex()
+            except binascii.Error:
+                return None
+    return None
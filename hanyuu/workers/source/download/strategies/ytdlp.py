@@ -5,7 +5,7 @@ import yt_dlp
 
 from hanyuu.config import getenv
 from hanyuu.database.main.connection import get_engine
-from hanyuu.database.main.models import QItemSource
+from hanyuu.database.main.models import FailureClass, QItemSource
 
 from .base import InvalidSource, SourceDownloadStrategy, TemporaryFailure
 
@@ -38,19 +38,19 @@ class YtDlpStrategy(SourceDownloadStrategy):
             with yt_dlp.YoutubeDL(params=params) as ydl:
                 yt_dlp_error_code = ydl.download(qitem_source.path)
         except yt_dlp.utils.DownloadError as e:
+            message = "yt-dlp failed with exception: " + e.msg
             if "Failed to extract any player response" in e.msg:
                 # probably internet connection error
-                exc_type = TemporaryFailure
+                raise TemporaryFailure(message, FailureClass.Network)
             elif "Sign in to confirm your age" in e.msg:
                 # need to pass cookies, because video is age restriced
-                exc_type = TemporaryFailure
+                raise TemporaryFailure(message, FailureClass.AgeRestricted)
             elif "https://github.com/yt-dlp/yt-dlp/issues/7271" in e.msg:
                 # failed to extract cookies from browser, use firefox
-                exc_type = TemporaryFailure
+                raise TemporaryFailure(message, FailureClass.Cookies)
             else:
                 # probably video is unavailable or invalid url
-                exc_type = InvalidSource
-            raise exc_type("yt-dlp failed with exception: " + e.msg)
+                raise InvalidSource(message)
         finally:
             # set downloading = False
             engine = await get_engine(True)
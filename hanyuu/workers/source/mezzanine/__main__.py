@@ -0,0 +1,74 @@
+import argparse
+import asyncio
+import logging
+from pathlib import Path
+from typing import Set
+
+import ffmpeg
+from sqlalchemy import select
+
+from hanyuu.config import getenv
+from hanyuu.database.main.connection import get_engine
+from hanyuu.database.main.models import QItemSource
+from hanyuu.video.mezzanine import MezzanineFormat, transcode
+from hanyuu.workers.utils import restrict_callrate, try_make_path_relative, worker_log_config
+
+logger = logging.getLogger(__name__)
+worker_dir = Path(getenv("resources_dir")) / "workers" / "source" / "mezzanine"
+output_dir = Path(getenv("resources_dir")) / "videos" / "mezzanines"
+
+# sources, transcoding of which failed during this run
+failed_sources: Set[int] = set()
+
+
+async def run_job(fmt: MezzanineFormat) -> None:
+    """
+    Transcode one downloaded source into mezzanine format
+    """
+
+    engine = await get_engine()
+    async with engine.async_session() as session:
+        source = await session.scalar(
+            select(QItemSource)
+            .where(QItemSource.local_fp.isnot(None))
+            .where(QItemSource.mezzanine_fp.is_(None))
+            .where(QItemSource.invalid.is_(False))
+            .where(QItemSource.id.not_in(failed_sources))
+            .limit(1)
+        )
+    if source is None:
+        return
+
+    # session is closed, so that no connection is held during transcoding
+    output_fp = try_make_path_relative(output_dir / f"{source.id}.{fmt.extension}")
+    logger.info(f"Transcoding source_id={source.id} from {source.local_fp} to {output_fp}")
+    try:
+        await asyncio.to_thread(transcode, source.local_fp, str(output_fp), fmt)
+    except ffmpeg.Error as e:
+        logger.warning(f"Transcoding of source_id={source.id} failed: {e}")
+        failed_sources.add(source.id)
+        return
+
+    async with engine.async_session() as session:
+        current = await session.get(QItemSource, source.id)
+        # source could be deleted or redownloaded meanwhile
+        if current is None or current.local_fp != source.local_fp:
+            return
+        current.mezzanine_fp = str(output_fp)
+        await session.commit()
+
+
+async def main(interval: float, fmt: MezzanineFormat) -> None:
+    rate_limited_run_job = restrict_callrate(interval)(run_job)
+    while True:
+        await rate_limited_run_job(fmt)
+
+
+if __name__ == "__main__":
+    worker_log_config(str((worker_dir / ".log").resolve()))
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-t", type=float, default=5, help="interval in seconds between job starts")
+    parser.add_argument("--height", type=int, default=720, help="maximum height of mezzanine video")
+    parser.add_argument("--gop", type=float, default=1, help="interval in seconds between keyframes")
+    args = parser.parse_args()
+    asyncio.run(main(args.t, MezzanineFormat(height=args.height, keyframe_interval=args.gop)))
@@ -0,0 +1,111 @@
+import argparse
+import asyncio
+import logging
+from pathlib import Path
+from typing import Optional, Set
+
+import ffmpeg
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from hanyuu.config import getenv
+from hanyuu.database.main.connection import get_engine
+from hanyuu.database.main.models import QItemSource, SourceMedia, SourcePreview
+from hanyuu.video.preview import PreviewFormat, make_peaks, make_proxy, make_sprite
+from hanyuu.workers.utils import restrict_callrate, try_make_path_relative, worker_log_config
+
+logger = logging.getLogger(__name__)
+worker_dir = Path(getenv("resources_dir")) / "workers" / "source" / "preview"
+output_dir = Path(getenv("resources_dir")) / "videos" / "previews"
+
+# sources, preview making of which failed during this run
+failed_sources: Set[int] = set()
+
+
+async def run_job(fmt: PreviewFormat) -> None:
+    """
+    Make preview files of one probed source, which has no preview (or has outdated one)
+    """
+
+    engine = await get_engine()
+    async with engine.async_session() as session:
+        row = (
+            await session.execute(
+                select(QItemSource, SourceMedia)
+                .join(QItemSource.media)
+                .outerjoin(QItemSource.preview)
+                .where(QItemSource.local_fp.isnot(None))
+                .where(QItemSource.invalid.is_(False))
+                # media info is needed for sprite, so wait for probe stage
+                .where(SourceMedia.local_fp == QItemSource.local_fp)
+                .where(SourcePreview.id.is_(None) | (SourcePreview.local_fp != QItemSource.local_fp))
+                .where(QItemSource.id.not_in(failed_sources))
+                .limit(1)
+            )
+        ).first()
+    if row is None:
+        return
+    source, media = row
+
+    # session is closed, so that no connection is held while ffmpeg runs
+    source_dir = output_dir / str(source.id)
+    proxy_fp = try_make_path_relative(source_dir / "proxy.mp4")
+    peaks_fp = try_make_path_relative(source_dir / "peaks.json") if media.audio_codec is not None else None
+    has_video = media.video_codec is not None and None not in [media.width, media.height, media.duration]
+    sprite_fp = try_make_path_relative(source_dir / "sprite.jpg") if has_video else None
+    tile_height = round(fmt.tile_width * media.height / media.width / 2) * 2 if has_video else None
+
+    def make_files() -> Optional[int]:
+        make_proxy(source.local_fp, str(proxy_fp), fmt)
+        # proxy is much faster to decode than source
+        if peaks_fp is not None:
+            make_peaks(str(proxy_fp), str(peaks_fp), fmt)
+        if sprite_fp is not None:
+            return make_sprite(str(proxy_fp), str(sprite_fp), media.duration, tile_height, fmt)
+        return None
+
+    logger.info(f"Making preview of source_id={source.id} from {source.local_fp} in {source_dir}")
+    try:
+        sprite_frames = await asyncio.to_thread(make_files)
+    except ffmpeg.Error as e:
+        logger.warning(f"Making preview of source_id={source.id} failed: {e}, {e.stderr}")
+        failed_sources.add(source.id)
+        return
+
+    async with engine.async_session() as session:
+        current = await session.get(QItemSource, source.id, options=[selectinload(QItemSource.preview)])
+        # source could be deleted or redownloaded meanwhile
+        if current is None or current.local_fp != source.local_fp:
+            return
+        preview = current.preview
+        if preview is None:
+            preview = SourcePreview(qitem_source_id=source.id)
+            session.add(preview)
+        preview.local_fp = source.local_fp
+        preview.proxy_fp = str(proxy_fp)
+        preview.peaks_fp = str(peaks_fp) if peaks_fp is not None else None
+        preview.sprite_fp = str(sprite_fp) if sprite_fp is not None else None
+        preview.sprite_interval = fmt.sprite_interval if sprite_fp is not None else None
+        preview.sprite_columns = fmt.sprite_columns if sprite_fp is not None else None
+        preview.sprite_frames = sprite_frames
+        preview.tile_width = fmt.tile_width if sprite_fp is not None else None
+        preview.tile_height = tile_height
+        await session.commit()
+
+
+async def main(interval: float, fmt: PreviewFormat) -> None:
+    rate_limited_run_job = restrict_callrate(interval)(run_job)
+    while True:
+        await rate_limited_run_job(fmt)
+
+
+if __name__ == "__main__":
+    worker_log_config(str((worker_dir / ".log").resolve()))
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-t", type=float, default=5, help="interval in seconds between job starts")
+    parser.add_argument("--height", type=int, default=360, help="maximum height of proxy video")
+    parser.add_argument("--sprite-interval", type=float, default=2, help="interval in seconds between sprite frames")
+    args = parser.parse_args()
+    fmt = PreviewFormat(sprite_interval=args.sprite_interval)
+    fmt.proxy.height = args.height
+    asyncio.run(main(args.t, fmt))
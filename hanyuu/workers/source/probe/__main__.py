@@ -0,0 +1,71 @@
+import argparse
+import asyncio
+import logging
+from pathlib import Path
+from typing import Set
+
+import ffmpeg
+from sqlalchemy import select
+
+from hanyuu.config import getenv
+from hanyuu.database.main.connection import get_engine
+from hanyuu.database.main.models import QItemSource, SourceMedia
+from hanyuu.video.probe import probe
+from hanyuu.workers.utils import restrict_callrate, worker_log_config
+
+logger = logging.getLogger(__name__)
+worker_dir = Path(getenv("resources_dir")) / "workers" / "source" / "probe"
+
+# sources, probing of which failed during this run
+failed_sources: Set[int] = set()
+
+
+async def run_job(keyframes: bool) -> None:
+    """
+    Probe one downloaded source, which has no media info (or has outdated one)
+    """
+
+    engine = await get_engine()
+    async with engine.async_session() as session:
+        source = await session.scalar(
+            select(QItemSource)
+            .outerjoin(QItemSource.media)
+            .where(QItemSource.local_fp.isnot(None))
+            .where(SourceMedia.id.is_(None) | (SourceMedia.local_fp != QItemSource.local_fp))
+            .where(QItemSource.id.not_in(failed_sources))
+            .limit(1)
+        )
+        if source is None:
+            return
+
+        logger.info(f"Probing source_id={source.id}, local_fp={source.local_fp}")
+        try:
+            media = probe(source.local_fp, keyframes=keyframes)
+        except ffmpeg.Error as e:
+            logger.warning(f"Probing of source_id={source.id} failed: {e}")
+            failed_sources.add(source.id)
+            return
+
+        existing = await source.awaitable_attrs.media
+        if existing is None:
+            session.add(SourceMedia(qitem_source_id=source.id, local_fp=source.local_fp, **media))
+        else:
+            existing.local_fp = source.local_fp
+            for k, v in media.items():
+                existing.__setattr__(k, v)
+        await session.commit()
+
+
+async def main(interval: float, keyframes: bool) -> None:
+    rate_limited_run_job = restrict_callrate(interval)(run_job)
+    while True:
+        await rate_limited_run_job(keyframes)
+
+
+if __name__ == "__main__":
+    worker_log_config(str((worker_dir / ".log").resolve()))
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-t", type=float, default=1, help="interval in seconds between job starts")
+    parser.add_argument("--no-keyframes", action="store_true", help="do not scan packets for keyframes index")
+    args = parser.parse_args()
+    asyncio.run(main(args.t, not args.no_keyframes))
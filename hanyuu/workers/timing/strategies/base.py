@@ -1,4 +1,11 @@
 from abc import ABC, abstractmethod
+from datetime import time
+from typing import Optional, Tuple
+
+from sqlalchemy import select
+
+from hanyuu.database.main.connection import get_engine
+from hanyuu.database.main.models import SourceMedia
 
 
 class TimingStrategy(ABC):
@@ -13,3 +20,27 @@ class TimingStrategy(ABC):
         Predict source timings, and add to database.
         """
         pass
+
+
+async def source_duration(qitem_source_id: int) -> Optional[float]:
+    """
+    Duration of source in seconds, if it was probed.
+    """
+
+    engine = await get_engine()
+    async with engine.async_session() as session:
+        return await session.scalar(select(SourceMedia.duration).where(SourceMedia.qitem_source_id == qitem_source_id))
+
+
+def seconds_to_time(seconds: float) -> time:
+    return microseconds_to_time(int(seconds * 1000000))
+
+
+def microseconds_to_time(microsecond: int) -> time:
+    def propagate(value: int, q: int) -> Tuple[int, int]:
+        return value // q, value % q
+
+    second, microsecond = propagate(microsecond, 1000000)
+    minute, second = propagate(second, 60)
+    hour, minute = propagate(minute, 60)
+    return time(hour=hour, minute=minute, second=second, microsecond=microsecond)
@@ -3,17 +3,28 @@ from datetime import time
 from hanyuu.database.main.connection import get_engine
 from hanyuu.database.main.models import QItemSourceTiming
 
-from .base import TimingStrategy
+from .base import TimingStrategy, seconds_to_time, source_duration
 
 
 class DefaultTiming(TimingStrategy):
+    def __init__(self, name: str, reveal_start: float = 50, reveal_duration: float = 10) -> None:
+        super().__init__(name)
+        self.reveal_start = reveal_start
+        self.reveal_duration = reveal_duration
+
     async def run(self, qitem_source_id: int) -> None:
+        reveal_start = self.reveal_start
+        duration = await source_duration(qitem_source_id)
+        if duration is not None:
+            # don't reveal after the end of short sources
+            reveal_start = max(0, min(reveal_start, duration - self.reveal_duration))
+
         engine = await get_engine()
         async with engine.async_session() as session:
             timing = QItemSourceTiming(
                 qitem_source_id=qitem_source_id,
                 guess_start=time(),
-                reveal_start=time(second=50),
+                reveal_start=seconds_to_time(reveal_start),
                 added_by=self.name,
             )
             session.add(timing)
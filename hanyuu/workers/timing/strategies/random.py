@@ -1,17 +1,27 @@
 import random
 from datetime import time
-from typing import Tuple
 
 from hanyuu.database.main.connection import get_engine
 from hanyuu.database.main.models import QItemSourceTiming
 
-from .base import TimingStrategy
+from .base import TimingStrategy, microseconds_to_time, source_duration
 
 
 class RandomTiming(TimingStrategy):
+    def __init__(self, name: str, min_start: float = 1, max_start: float = 80, margin: float = 10) -> None:
+        super().__init__(name)
+        self.min_start = min_start
+        self.max_start = max_start
+        self.margin = margin  # minimal time between timing and the end of source
+
     async def run(self, qitem_source_id: int) -> None:
+        max_start = self.max_start
+        duration = await source_duration(qitem_source_id)
+        if duration is not None:
+            max_start = max(self.min_start, min(max_start, duration - self.margin))
+
         engine = await get_engine()
-        guess_reveal_time = random_time(1 * 1000000, 80 * 1000000)
+        guess_reveal_time = random_time(int(self.min_start * 1000000), int(max_start * 1000000))
         async with engine.async_session() as session:
             timing = QItemSourceTiming(
                 qitem_source_id=qitem_source_id,
@@ -24,11 +34,4 @@ class RandomTiming(TimingStrategy):
 
 
 def random_time(a: int, b: int) -> time:
-    def propagate(value: int, q: int) -> Tuple[int, int]:
-        return value // q, value % q
-
-    microsecond = random.randint(a, b)
-    second, microsecond = propagate(microsecond, 1000000)
-    minute, second = propagate(second, 60)
-    hour, minute = propagate(minute, 60)
-    return time(hour=hour, minute=minute, second=second, microsecond=microsecond)
+    return microseconds_to_time(random.randint(a, b))
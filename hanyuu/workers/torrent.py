@@ -1,14 +1,18 @@
 import argparse
 import asyncio
+import datetime
 import logging
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Optional
 
 import qbittorrentapi as qbt
 
 from hanyuu.config import getenv
 from hanyuu.database.main.connection import get_engine
-from hanyuu.database.main.models import QItemSource
+from hanyuu.database.main.models import FailureClass, QItemSource
+from hanyuu.workers.source.download.dedup import register_file
+from hanyuu.workers.source.download.retry import schedule_retry
+from hanyuu.workers.source.download.strategies.torrent import TorrentState, has_metadata, select_file
 from hanyuu.workers.utils import FiledList, try_make_path_relative, worker_log_config
 
 _qbt_client: Optional[qbt.Client] = None
@@ -30,7 +34,46 @@ def get_qbt_client() -> qbt.Client:
     return _qbt_client
 
 
-async def check(strategy_name: str) -> None:
+async def mark_source(qitem_source_id: int, invalid: bool) -> None:
+    engine = await get_engine()
+    async with engine.async_session() as session:
+        source = await session.get(QItemSource, qitem_source_id)
+        source.invalid = invalid
+        source.downloading = False
+        await session.commit()
+
+
+async def wait_metadata(client: qbt.Client, dtf: Dict[str, Any], metadata_timeout: float) -> Optional[Dict[str, Any]]:
+    """
+    Step of magnet link state machine: select file to download when metadata is received,
+    or schedule retry when it was not received in metadata_timeout seconds.
+
+    Returns updated entry, or None if it should be removed.
+    """
+
+    if has_metadata(client, dtf["infohash"]):
+        file_path = select_file(client, dtf["infohash"], dtf["name"], dtf["exclusive"])
+        if file_path is None:
+            logger.warning(f"{dtf["name"]} has been removed as it was not found in torrent {dtf["infohash"]}")
+            await mark_source(dtf["qitem_source_id"], invalid=True)
+            return None
+        logger.info(f"Metadata for {dtf["infohash"]} has been received, downloading {file_path}")
+        return dtf | {"name": file_path, "state": TorrentState.DOWNLOADING.value}
+
+    waited = datetime.datetime.now() - datetime.datetime.fromisoformat(dtf["added_on"])
+    if waited.total_seconds() < metadata_timeout:
+        return dtf
+
+    message = f"Metadata for {dtf["infohash"]} was not received in {metadata_timeout} seconds"
+    logger.warning(f"{dtf["name"]} has been removed: {message}")
+    if dtf["exclusive"]:
+        client.torrents_delete(delete_files=True, torrent_hashes=dtf["infohash"])
+    await mark_source(dtf["qitem_source_id"], invalid=False)
+    await schedule_retry(dtf["qitem_source_id"], FailureClass.Metadata, message)
+    return None
+
+
+async def check(strategy_name: str, metadata_timeout: float) -> None:
     worker_dir = Path(getenv("resources_dir")) / "workers" / "source" / "download" / strategy_name
     async with FiledList(str(worker_dir / "downloading_torrents.json")) as dtfs:
         hashes = set([t["infohash"] for t in dtfs])
@@ -42,6 +85,12 @@ async def check(strategy_name: str) -> None:
 
         new_dtfs = []
         for dtf in dtfs:
+            if dtf.get("state", TorrentState.DOWNLOADING.value) == TorrentState.METADATA.value:
+                dtf = await wait_metadata(client, dtf, metadata_timeout)
+                if dtf is not None:
+                    new_dtfs.append(dtf)
+                continue
+
             if dtf["infohash"] not in torrents:
                 logger.warning(f"{dtf["name"]} has been removed as it's not in QBT anymore")
                 continue
@@ -61,6 +110,7 @@ async def check(strategy_name: str) -> None:
                     source.local_fp = str(local_fp)
                     source.downloading = False
                     await session.commit()
+                await register_file(dtf["qitem_source_id"])
                 logger.info(f"{dtf["name"]} has been removed as it has been downloaded, local_fp='{local_fp}'")
             else:
                 new_dtfs.append(dtf)
@@ -68,9 +118,9 @@ async def check(strategy_name: str) -> None:
         dtfs[:] = new_dtfs
 
 
-async def main(interval: float, strategy_name: str) -> None:
+async def main(interval: float, strategy_name: str, metadata_timeout: float) -> None:
     while True:
-        await check(strategy_name)
+        await check(strategy_name, metadata_timeout)
         await asyncio.sleep(interval)
 
 
@@ -78,6 +128,12 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser("Torrent status checking")
     parser.add_argument("-t", type=float, default=15, help="interval between fetches of qbt torrents info")
     parser.add_argument("--strategy", type=str, default="strategy_torrent", help="name of torrent strategy")
+    parser.add_argument(
+        "--metadata-timeout",
+        type=float,
+        default=600,
+        help="magnet links without received metadata for this amount of seconds are retried later",
+    )
     args = parser.parse_args()
     worker_log_config(Path(getenv("resources_dir")) / "workers" / "torrents.log")
-    asyncio.run(main(args.t, args.strategy))
+    asyncio.run(main(args.t, args.strategy, args.metadata_timeout))
@@ -10,8 +10,7 @@ function add_item(el) {
         if (response.ok) {
             response.text().then((text) => {
                 let new_item = $(text);
-                list.append(new_item);
-                bind_inputs();
+                put_item(list, new_item);
                 $("body, html").animate({ scrollTop: new_item.offset().top }, 500);
             });
         } else {
@@ -130,4 +129,56 @@ function bind_inputs() {
     })
 }
 
-$(bind_inputs)
\ No newline at end of file
+$(bind_inputs)
+
+function put_item(list, new_item) {
+    // item could be already added by change event
+    let item = list.children(`.editable-list-item[data-id="${new_item.data("id")}"]`);
+    if (item.length) item.replaceWith(new_item);
+    else list.append(new_item);
+    bind_inputs();
+}
+
+function find_item(kind, id) {
+    return $(`.editable-list[data-base-action="/${kind}"] > .editable-list-item[data-id="${id}"]`);
+}
+
+function apply_change(change) {
+    if (change.kind === "reload") {
+        // some changes were missed
+        if ($("form.unsaved").length) console.log("Changes were missed, reload page to see them");
+        else window.location.reload();
+        return;
+    }
+    if (change.op === "DELETE") {
+        find_item(change.kind, change.id).remove();
+        return;
+    }
+    fetch(`/${change.kind}/${change.id}`).then((response) => {
+        if (!response.ok) return;
+        response.text().then((text) => {
+            let new_item = $(text);
+            let item = find_item(change.kind, change.id);
+            if (item.length) {
+                // unsaved edits are kept, nested lists get their own changes
+                let form = item.children("form");
+                if (form.hasClass("unsaved")) return;
+                form.replaceWith(new_item.children("form"));
+                bind_inputs();
+            } else if (change.parent_kind) {
+                let list = find_item(change.parent_kind, change.parent_id)
+                    .children(`.editable-list[data-base-action="/${change.kind}"]`);
+                if (list.length) put_item(list, new_item);
+            }
+        });
+    });
+}
+
+function listen_changes() {
+    let anime_id = $("head").data("anime-id");
+    if (anime_id === undefined) return;
+    let events = new EventSource(`/animes/${anime_id}/events`);
+    events.addEventListener("change", (event) => apply_change(JSON.parse(event.data)));
+}
+
+$(listen_changes)
@@ -1,10 +1,26 @@
+function wait_for_import(status_url, on_finish) {
+    fetch(status_url).then((response) => response.json()).then((status) => {
+        if (status.finished) on_finish(status);
+        else setTimeout(() => wait_for_import(status_url, on_finish), 1000);
+    });
+}
+
 function create_anime(el) {
     let card = $(el).closest(".search-result");
     let mal_id = card.data("mal-id");
     fetch(`/animes?mal_id=${mal_id}`, {
         method: "POST",
     }).then((response) => {
-        if (response.ok) card.addClass("added");
+        if (response.ok)
+            response.json().then((accepted) => {
+                card.addClass("adding");
+                wait_for_import(accepted.status_url, (status) => {
+                    card.removeClass("adding");
+                    let item = status.items[0];
+                    if (item.status == "Done" || item.status == "Exists") card.addClass("added");
+                    else console.log(item.error || status.error);
+                });
+            });
         else
             response.text().then((text) => {
                 console.log(text);
@@ -0,0 +1,76 @@
+"""
+Deletes of rows shown on anime page must be published with anime id, so that open pages remove them.
+Needs a PostgreSQL database given by TEST_DATABASE_URL (postgresql+asyncpg://...), notifications are sent
+only on commit, so rows are committed and removed afterwards.
+"""
+
+import asyncio
+import os
+
+import orjson
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from hanyuu.database.main.models import Anime, Base
+from hanyuu.webapp import events
+
+from .test_loaders import make_anime, mal_id
+
+url = os.environ.get("TEST_DATABASE_URL")
+pytestmark = pytest.mark.skipif(url is None, reason="TEST_DATABASE_URL is not set")
+
+
+async def wait_for(changes: list, expected: dict) -> None:
+    for _ in range(50):
+        if expected in changes:
+            return
+        await asyncio.sleep(0.1)
+    raise AssertionError(f"{expected} was not published, got {changes}")
+
+
+async def publish_deletes() -> None:
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await events.create_triggers(conn)
+
+    changes = []
+    try:
+        async with engine.connect() as listener, AsyncSession(engine, expire_on_commit=False) as session:
+            raw = (await listener.get_raw_connection()).driver_connection
+            await raw.add_listener(events.channel, lambda *args: changes.append(orjson.loads(args[-1])))
+
+            anime = make_anime(1, 2, 1)
+            session.add(anime)
+            await session.commit()
+            qitem = anime.qitems[0]
+            timing, source, difficulty = qitem.sources[0].timings[0], qitem.sources[1], qitem.difficulties[0]
+
+            # timing of the first source first, as deleted source takes its timings with it
+            for item, kind, parent_kind, parent_id in [
+                (timing, "timings", "sources", qitem.sources[0].id),
+                (source, "sources", "qitems", qitem.id),
+                (difficulty, "difficulties", "qitems", qitem.id),
+            ]:
+                await session.delete(item)
+                await session.commit()
+                expected = {
+                    "kind": kind,
+                    "id": item.id,
+                    "op": "DELETE",
+                    "parent_kind": parent_kind,
+                    "parent_id": parent_id,
+                    "anime_id": mal_id,
+                }
+                await wait_for(changes, expected)
+    finally:
+        async with AsyncSession(engine) as session:
+            anime = await session.get(Anime, mal_id)
+            if anime is not None:
+                await session.delete(anime)
+                await session.commit()
+        await engine.dispose()
+
+
+def test_deletes_are_published():
+    asyncio.run(publish_deletes())
@@ -0,0 +1,113 @@
+"""
+Number of queries of anime page loader must not depend on number of qitems, sources and timings.
+Needs a PostgreSQL database given by TEST_DATABASE_URL (postgresql+asyncpg://...), rows are rolled back.
+"""
+
+import asyncio
+import os
+from datetime import time
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from hanyuu.database.main.models import (
+    Anime,
+    Base,
+    Category,
+    QItem,
+    QItemDifficulty,
+    QItemSource,
+    QItemSourceTiming,
+    QuizPart,
+    SourceMedia,
+)
+from hanyuu.webapp import loaders
+
+url = os.environ.get("TEST_DATABASE_URL")
+pytestmark = pytest.mark.skipif(url is None, reason="TEST_DATABASE_URL is not set")
+
+# not an id of real anime, so that test database may have other rows
+mal_id = -1
+
+
+def make_anime(n_qitems: int, n_sources: int, n_timings: int) -> Anime:
+    no_date = {"day": None, "month": None, "year": None}
+    anime = Anime(
+        mal_id=mal_id,
+        anidb_id=mal_id,
+        shiki_title_ro="title",
+        shiki_url="url",
+        shiki_poster_url="poster",
+        shiki_poster_thumb_url="thumb",
+        shiki_episodes=1,
+        shiki_aired_on=no_date,
+        shiki_released_on=no_date,
+        shiki_videos=[],
+        shiki_synonyms=[],
+        shiki_genres=[],
+    )
+    for number in range(1, n_qitems + 1):
+        difficulty = QItemDifficulty(value=50, added_by="test")
+        qitem = QItem(category=Category.Opening, number=number, difficulties=[difficulty])
+        for i in range(n_sources):
+            source = QItemSource(platform="local", path=f"{number}-{i}", added_by="test")
+            if i % 2 == 0:
+                source.media = SourceMedia(local_fp="video.mp4")
+            for _ in range(n_timings):
+                timing = QItemSourceTiming(guess_start=time.min, reveal_start=time.min, added_by="test")
+                timing.quizparts.append(QuizPart(difficulty=difficulty, style="default", local_fp="part.mp4"))
+                source.timings.append(timing)
+            qitem.sources.append(source)
+        anime.qitems.append(qitem)
+    return anime
+
+
+def touch(anime: Anime) -> int:
+    # lazy load of anything not loaded by loader raises in async session
+    n = 0
+    for qitem in anime.qitems:
+        n += len(qitem.difficulties)
+        for source in qitem.sources:
+            n += source.media is not None
+            n += source.preview is not None
+            for timing in source.timings:
+                n += len(timing.quizparts)
+    return n
+
+
+async def count_queries(n_qitems: int, n_sources: int, n_timings: int) -> int:
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    try:
+        async with engine.connect() as conn:
+            await conn.begin()
+            session = AsyncSession(bind=conn, join_transaction_mode="create_savepoint")
+            session.add(make_anime(n_qitems, n_sources, n_timings))
+            await session.flush()
+            session.expunge_all()
+
+            event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+            anime = await loaders.load_anime(session, mal_id)
+            touch(anime)
+            event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+            assert len(anime.qitems) == n_qitems
+            assert sum(len(qitem.sources) for qitem in anime.qitems) == n_qitems * n_sources
+            await session.close()
+            await conn.rollback()
+    finally:
+        await engine.dispose()
+    return len(statements)
+
+
+def test_load_anime_query_count_is_constant():
+    counts = [asyncio.run(count_queries(*size)) for size in [(1, 1, 1), (3, 2, 2), (8, 5, 3)]]
+    assert counts[0] == counts[1] == counts[2], counts